@@ -1,19 +1,44 @@
 import os
+import sys
+import asyncio
 from dotenv import load_dotenv
-from anthropic import Anthropic
 from mcp.server.fastmcp import FastMCP
-from tools.gmail_tools import GmailTool
-from tools.googles_apis import create_service
 
 # Load .env variables
 load_dotenv()
 CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
-claude = Anthropic(api_key=CLAUDE_API_KEY) if CLAUDE_API_KEY else None
+MAIL_INDEX = os.getenv("MAIL_INDEX", "1") != "0"
+MAIL_INDEX_SYNC_INTERVAL = float(os.getenv("MAIL_INDEX_SYNC_INTERVAL") or 10)
+MESSAGE_CACHE_BYTES = int(os.getenv("MESSAGE_CACHE_BYTES") or 32 * 1024 * 1024)
+claude = None
 
 # Create working directory
 work_dir = os.path.dirname(__file__)
 secret_path = os.path.join(work_dir, "client-secret.json")
-gmail_tool = GmailTool(secret_path)
+index_path = os.getenv("MAIL_INDEX_DB") or os.path.join(work_dir, "mail_index.db")
+gmail_tool = None
+
+# The Anthropic SDK and the Google client libraries are slow to import, and the
+# Gmail service needs OAuth credentials, so both are built by the first tool
+# that uses them rather than at startup.
+def get_claude():
+    global claude
+    if claude is None and CLAUDE_API_KEY:
+        from anthropic import Anthropic
+        claude = Anthropic(api_key=CLAUDE_API_KEY)
+    return claude
+
+def get_gmail_tool():
+    global gmail_tool
+    if gmail_tool is None:
+        from tools.gmail_tools import GmailTool
+        gmail_tool = GmailTool(
+            secret_path,
+            index_path=index_path if MAIL_INDEX else None,
+            sync_interval=MAIL_INDEX_SYNC_INTERVAL,
+            cache_bytes=MESSAGE_CACHE_BYTES,
+        )
+    return gmail_tool
 
 # Initialize MCP
 mcp = FastMCP("GMAIL")
@@ -24,6 +49,7 @@ def analyze_gmail_query(query: str) -> str:
     """
     Use Claude to analyze a Gmail-related natural language command.
     """
+    claude = get_claude()
     if not claude:
         return "Claude API key missing. Please set CLAUDE_API_KEY in your .env file."
 
@@ -41,25 +67,42 @@ def analyze_gmail_query(query: str) -> str:
 # Gmail tools via decorators
 @mcp.tool()
 def send_email(to: str, subject: str, body: str) -> str:
-    return gmail_tool.send_email(to, subject, body)
+    return get_gmail_tool().send_email(to, subject, body)
+
+@mcp.tool()
+def send_emails(recipients: list[str], subject: str, body: str, max_workers: int = 4) -> str:
+    """
+    Send the same email separately to each recipient, at most max_workers at a time.
+    """
+    results = get_gmail_tool().send_emails(
+        [{"to": to, "subject": subject, "body": body} for to in recipients],
+        max_workers=max_workers,
+    )
+    return "\n".join(f"{to}: {result}" for to, result in zip(recipients, results))
 
 @mcp.tool()
 def get_email_message_details(message_id: str) -> str:
-    return gmail_tool.get_email_message_details(message_id)
+    return get_gmail_tool().get_email_message_details(message_id)
 
 @mcp.tool()
 def get_email_message_body(message_id: str) -> str:
-    return gmail_tool.get_email_message_body(message_id)
+    return get_gmail_tool().get_email_message_body(message_id)
 
 @mcp.tool()
-def search_emails(query: str = None) -> str:
-    return gmail_tool.search_emails(query)
+def search_emails(query: str = None, label: str = "INBOX", max_results: int = 50, page_token: str = None) -> str:
+    """
+    Search emails one page at a time. label is one of ALL, INBOX, SENT, DRAFT,
+    SPAM or TRASH. Pass the returned next_page_token as page_token to get the
+    next page; it is null on the last page.
+    """
+    return get_gmail_tool().search_emails(query, label, max_results, page_token)
 
 @mcp.tool()
 def delete_email_message(message_id: str) -> str:
-    return gmail_tool.delete_email_message(message_id)
+    return get_gmail_tool().delete_email_message(message_id)
 
 if __name__ == "__main__":
-    print("Running Gmail MCP Tool Server...")
-    print(f"Registered tools: {list(mcp.tools.keys())}")
+    # stdout carries the MCP protocol, so status lines go to stderr.
+    print("Running Gmail MCP Tool Server...", file=sys.stderr)
+    print(f"Registered tools: {[tool.name for tool in asyncio.run(mcp.list_tools())]}", file=sys.stderr)
     mcp.run()
\ No newline at end of file
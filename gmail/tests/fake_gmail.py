@@ -0,0 +1,286 @@
+"""In-process stand-in for the parts of the Gmail REST API that GmailTool uses.
+
+Serves messages get/list, batch requests, the profile, the history list and
+messages.send uploads (simple, multipart and resumable) over HTTP on
+127.0.0.1, so the real googleapiclient request, batch and upload code runs
+against it without credentials or network access.
+"""
+import copy
+import email
+import json
+import re
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_MESSAGE = re.compile(r'/gmail/v1/users/me/messages/([^/]+)$')
+_SEND = '/upload/gmail/v1/users/me/messages/send'
+_SESSION = re.compile(r'/upload/sessions/([^/]+)$')
+_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+)$')
+# One multipart body part: line break, headers, blank line, payload, line break.
+_PART = re.compile(rb'\r?\n.*?\r?\n\r?\n(.*?)\r?\n$', re.DOTALL)
+
+
+def make_message(i: int) -> dict:
+    return {
+        'id': f'm{i:05d}',
+        'threadId': f't{i:05d}',
+        'historyId': str(1000 + i),
+        'internalDate': str(1700000000000 + i * 1000),
+        'labelIds': ['INBOX'] + (['STARRED'] if i % 7 == 0 else []),
+        'snippet': f'snippet {i}',
+        'payload': {
+            'mimeType': 'multipart/mixed' if i % 5 == 0 else 'text/plain',
+            'headers': [
+                {'name': 'Subject', 'value': f'Subject {i}'},
+                {'name': 'From', 'value': f'sender{i}@example.com'},
+                {'name': 'To', 'value': 'me@example.com'},
+                {'name': 'Date', 'value': 'Mon, 1 Jan 2024 00:00:00 +0000'},
+            ],
+            'body': {'data': 'aGVsbG8='},
+        },
+    }
+
+
+class FakeGmail:
+    """
+    A mailbox of `count` messages (ids m00000, m00001, ...) behind a local HTTP server.
+
+    Changes made through add/modify/remove are recorded as history records.
+    Message ids in `throttle` get one 429 each before they are served, and a
+    history list starting before `min_history_id` fails with 404, as Gmail
+    does once it has expired the history.
+
+    Sent messages are kept in `sent` as raw bytes. Resumable upload chunks
+    whose number (1-based, counting every chunk PUT) is in `fail_chunks`
+    store the first half of their bytes, then fail with `fail_status`, so the
+    client has to ask for the offset and resume from it.
+    """
+
+    def __init__(self, count: int = 120) -> None:
+        self.messages = {message['id']: message for message in map(make_message, range(count))}
+        self.history = []
+        self.history_id = 5000
+        self.min_history_id = 5000
+        self.throttle = set()
+        self.requests = Counter()
+        self.fetched = []
+        self.sent = []
+        self.uploads = {}
+        self.chunk_starts = []
+        self.fail_chunks = set()
+        self.fail_status = 503
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self) -> 'FakeGmail':
+        fake = self
+
+        class Handler(_Handler):
+            gmail = fake
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self._server.server_port}/'
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def service(self):
+        """A Gmail service object whose requests go to this server."""
+        import httplib2
+        from googleapiclient import discovery_cache
+        from googleapiclient.discovery import build_from_document
+
+        document = json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+        document['rootUrl'] = document['mtlsRootUrl'] = self.url
+        return build_from_document(document, http=httplib2.Http())
+
+#
+    def _record(self, kind: str, msg_id: str, labels=None) -> None:
+        self.history_id += 1
+        item = {'message': {'id': msg_id}}
+        if labels:
+            item['labelIds'] = labels
+        self.history.append({'id': str(self.history_id), kind: [item]})
+
+    def add(self, message: dict) -> None:
+        self.messages[message['id']] = message
+        self._record('messagesAdded', message['id'])
+
+    def modify(self, msg_id: str, add=(), remove=()) -> None:
+        message = self.messages[msg_id]
+        message['labelIds'] = [label for label in message['labelIds'] if label not in remove] + list(add)
+        message['historyId'] = str(self.history_id + 1)
+        if add:
+            self._record('labelsAdded', msg_id, list(add))
+        if remove:
+            self._record('labelsRemoved', msg_id, list(remove))
+
+    def remove(self, msg_id: str) -> None:
+        del self.messages[msg_id]
+        self._record('messagesDeleted', msg_id)
+
+#
+    def get_message(self, msg_id: str, query: dict):
+        with self._lock:
+            self.requests['get'] += 1
+            if msg_id in self.throttle:
+                self.throttle.discard(msg_id)
+                return 429, {'error': {'code': 429, 'message': 'Rate Limit Exceeded'}}
+            self.fetched.append(msg_id)
+        if msg_id not in self.messages:
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+        message = copy.deepcopy(self.messages[msg_id])
+        message_format = query.get('format', ['full'])[0]
+        self.requests[message_format] += 1
+        if message_format == 'minimal':
+            del message['payload']
+        elif message_format == 'metadata':
+            keep = set(query.get('metadataHeaders', []))
+            payload = message['payload']
+            message['payload'] = {
+                'mimeType': payload['mimeType'],
+                'headers': [header for header in payload['headers'] if header['name'] in keep],
+            }
+        return 200, message
+
+    def list_messages(self, query: dict):
+        self.requests['list'] += 1
+        msg_ids = sorted(self.messages, key=lambda msg_id: int(self.messages[msg_id]['internalDate']), reverse=True)
+        start = int(query.get('pageToken', ['0'])[0])
+        size = int(query.get('maxResults', ['100'])[0])
+        page = msg_ids[start:start + size]
+        result = {
+            'messages': [{'id': msg_id, 'threadId': self.messages[msg_id]['threadId']} for msg_id in page],
+            'resultSizeEstimate': len(msg_ids),
+        }
+        if start + size < len(msg_ids):
+            result['nextPageToken'] = str(start + size)
+        return 200, result
+
+    def list_history(self, query: dict):
+        self.requests['history'] += 1
+        start = int(query['startHistoryId'][0])
+        if start < self.min_history_id:
+            return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+        records = [record for record in self.history if int(record['id']) > start]
+        return 200, {'history': records, 'historyId': str(self.history_id)}
+
+    def send_message(self, raw: bytes):
+        self.sent.append(raw)
+        msg_id = f's{len(self.sent):05d}'
+        return 200, {'id': msg_id, 'threadId': msg_id, 'labelIds': ['SENT']}
+
+    def start_upload(self, total: int):
+        self.requests['upload_start'] += 1
+        upload_id = f'u{len(self.uploads) + 1}'
+        self.uploads[upload_id] = {'data': bytearray(), 'total': total}
+        return 200, {}, {'Location': f'{self.url}upload/sessions/{upload_id}'}
+
+    def put_chunk(self, upload_id: str, content_range: str, body: bytes):
+        upload = self.uploads[upload_id]
+        data = upload['data']
+        if content_range.startswith('bytes */'):
+            # Status query after a failed chunk: report how much has arrived.
+            self.requests['upload_status'] += 1
+        else:
+            self.requests['upload_chunk'] += 1
+            start, end, total = map(int, _RANGE.match(content_range).groups())
+            self.chunk_starts.append(start)
+            if start != len(data) or end - start + 1 != len(body):
+                return 400, {'error': {'code': 400, 'message': f'Expected bytes from {len(data)}'}}, {}
+            if self.requests['upload_chunk'] in self.fail_chunks:
+                data += body[:len(body) // 2]
+                return self.fail_status, {'error': {'code': self.fail_status, 'message': 'Backend Error'}}, {}
+            data += body
+            if len(data) == total:
+                return (*self.send_message(bytes(data)), {})
+        return 308, b'', {'Range': f'bytes=0-{len(data) - 1}'} if data else {}
+
+    def batch(self, content_type: str, body: bytes) -> bytes:
+        self.requests['batch'] += 1
+        request = email.message_from_bytes(b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+        parts = []
+        for part in request.get_payload():
+            url = urlparse(part.get_payload().split()[1])
+            status, result = self.get_message(_MESSAGE.match(url.path).group(1), parse_qs(url.query))
+            parts.append(
+                f'--batch_fake\r\nContent-Type: application/http\r\n'
+                f'Content-ID: <response-{part["Content-ID"].strip("<>")}>\r\n\r\n'
+                f'HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n\r\n{json.dumps(result)}\r\n'
+            )
+        return (''.join(parts) + '--batch_fake--').encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    gmail = None
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, status: int, body, content_type: str = 'application/json', headers=None) -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        match = _MESSAGE.match(url.path)
+        if match:
+            return self._send(*self.gmail.get_message(match.group(1), query))
+        if url.path == '/gmail/v1/users/me/messages':
+            return self._send(*self.gmail.list_messages(query))
+        if url.path == '/gmail/v1/users/me/history':
+            return self._send(*self.gmail.list_history(query))
+        if url.path == '/gmail/v1/users/me/profile':
+            self.gmail.requests['profile'] += 1
+            return self._send(200, {'emailAddress': 'me@example.com', 'historyId': str(self.gmail.history_id)})
+        self._send(404, {'error': {'code': 404, 'message': 'Not Found'}})
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path.startswith('/batch'):
+            return self._send(200, self.gmail.batch(self.headers['Content-Type'], body),
+                              'multipart/mixed; boundary=batch_fake')
+        url = urlparse(self.path)
+        if url.path == _SEND:
+            upload_type = parse_qs(url.query)['uploadType'][0]
+            self.gmail.requests[f'upload_{upload_type}'] += 1
+            if upload_type == 'resumable':
+                status, result, headers = self.gmail.start_upload(int(self.headers['X-Upload-Content-Length']))
+                return self._send(status, result, headers=headers)
+            if upload_type == 'multipart':
+                # multipart/related: the JSON metadata part, then the message itself.
+                media = body.split(b'--' + self.headers.get_param('boundary').encode())[2]
+                body = _PART.match(media).group(1)
+            return self._send(*self.gmail.send_message(body))
+        self._send(404, {'error': {'code': 404, 'message': 'Not Found'}})
+
+    def do_PUT(self) -> None:
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        match = _SESSION.match(urlparse(self.path).path)
+        if match is None:
+            return self._send(404, {'error': {'code': 404, 'message': 'Not Found'}})
+        status, result, headers = self.gmail.put_chunk(match.group(1), self.headers['Content-Range'], body)
+        self._send(status, result, headers=headers)
+
+
+def make_tool(gmail: FakeGmail, **kwargs):
+    """A GmailTool whose service talks to `gmail` instead of the Gmail API."""
+    from tools.gmail_tools import GmailTool
+
+    class FakeGmailTool(GmailTool):
+        def _init_service(self) -> None:
+            self.service = gmail.service()
+
+    return FakeGmailTool('client-secret.json', **kwargs)
@@ -0,0 +1,186 @@
+import email
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fake_gmail import FakeGmail, make_tool
+from tools import gmail_tools
+
+
+class BatchedMetadataTest(unittest.TestCase):
+    def setUp(self):
+        self.gmail = FakeGmail(count=60).start()
+        self.addCleanup(self.gmail.stop)
+        self.tool = make_tool(self.gmail)
+        self.tool.BATCH_SIZE = 10
+        sleep = mock.patch('tools.gmail_tools.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def test_results_follow_the_requested_order(self):
+        msg_ids = [f'm{i:05d}' for i in (42, 3, 17, 3, 0, 59, 25)]
+        messages = self.tool.get_email_messages_metadata(msg_ids)
+        self.assertEqual([message.msg_id for message in messages], msg_ids)
+        self.assertEqual(messages[0].subject, 'Subject 42')
+        self.assertTrue(messages[4].star)
+        self.assertTrue(messages[4].has_attachments)
+        # Duplicates are fetched once, all in one batch.
+        self.assertEqual(self.gmail.requests['batch'], 1)
+        self.assertEqual(self.gmail.requests['get'], 6)
+
+    def test_one_round_trip_per_batch(self):
+        msg_ids = [f'm{i:05d}' for i in range(60)]
+        messages = self.tool.get_email_messages_metadata(msg_ids)
+        self.assertEqual(len(messages), 60)
+        self.assertEqual(self.gmail.requests['batch'], 6)
+        self.sleep.assert_not_called()
+
+    def test_rate_limited_calls_are_retried(self):
+        self.gmail.throttle = {'m00004', 'm00011', 'm00012'}
+        msg_ids = [f'm{i:05d}' for i in range(20)]
+        messages = self.tool.get_email_messages_metadata(msg_ids)
+        self.assertEqual([message.msg_id for message in messages], msg_ids)
+        # Each throttled batch is retried once, with only the throttled ids.
+        self.assertEqual(self.gmail.requests['batch'], 4)
+        self.assertEqual(self.gmail.requests['get'], 23)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_retries_are_bounded(self):
+        self.tool.MAX_RETRIES = 2
+        with mock.patch.object(FakeGmail, 'get_message', return_value=(429, {'error': {'code': 429}})):
+            with self.assertRaises(RuntimeError):
+                self.tool.get_email_messages_metadata(['m00001'])
+        self.assertEqual(self.gmail.requests['batch'], 3)
+
+    def test_deleted_messages_are_skipped(self):
+        self.gmail.remove('m00002')
+        messages = self.tool.get_email_messages_metadata(['m00001', 'm00002', 'nope', 'm00003'])
+        self.assertEqual([message.msg_id for message in messages], ['m00001', 'm00003'])
+        self.sleep.assert_not_called()
+
+    def test_search_emails_pages(self):
+        page = self.tool.search_email_page(max_results=25)
+        self.assertEqual(page.count, 25)
+        self.assertEqual(page.messages[0].msg_id, 'm00059')
+        rest = list(self.tool.iter_emails(page_size=25))
+        self.assertEqual(len(rest), 60)
+        self.assertEqual(len({message.msg_id for message in rest}), 60)
+
+    def test_last_api_page_has_no_token(self):
+        first = self.tool.search_email_page(max_results=50)
+        last = self.tool.search_email_page(max_results=50, page_token=first.next_page_token)
+        self.assertEqual((first.count, last.count), (50, 10))
+        self.assertIsNone(last.next_page_token)
+
+
+class MessageDetailsTest(unittest.TestCase):
+    def setUp(self):
+        self.gmail = FakeGmail(count=10).start()
+        self.addCleanup(self.gmail.stop)
+        self.tool = make_tool(self.gmail)
+
+    def test_cached_messages_are_revalidated(self):
+        self.assertFalse(self.tool.get_email_message_details('m00001').star)
+        self.assertFalse(self.tool.get_email_message_details('m00001').star)
+        self.assertEqual((self.gmail.requests['full'], self.gmail.requests['minimal']), (1, 1))
+
+        self.gmail.modify('m00001', add=['STARRED'])
+        self.assertTrue(self.tool.get_email_message_details('m00001').star)
+        self.assertEqual((self.gmail.requests['full'], self.gmail.requests['minimal']), (2, 2))
+
+    def test_body_reuses_the_cached_message(self):
+        self.tool.get_email_message_details('m00001')
+        self.assertEqual(self.tool.get_email_message_body('m00001'), 'hello')
+        self.assertEqual(self.gmail.requests['get'], 1)
+
+
+class SendEmailTest(unittest.TestCase):
+    CHUNK = 256 * 1024
+
+    def setUp(self):
+        self.gmail = FakeGmail(count=1).start()
+        self.addCleanup(self.gmail.stop)
+        self.tool = make_tool(self.gmail)
+        self.tool.UPLOAD_CHUNK_SIZE = self.CHUNK
+        self.tool.RESUMABLE_THRESHOLD = self.CHUNK
+        self.tool.SPOOL_SIZE = 64 * 1024
+        sleep = mock.patch('tools.gmail_tools.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # About 1.4 MB once base64-encoded: six chunks.
+        self.attachment = os.path.join(directory.name, 'report.bin')
+        with open(self.attachment, 'wb') as f:
+            f.write(os.urandom(1024 * 1024))
+
+    def send(self, attachments=True):
+        return self.tool.send_email(
+            'you@example.com', 'Report', 'See attached.',
+            attachments_paths=[self.attachment] if attachments else None
+        )
+
+    def assert_sent_intact(self):
+        self.assertEqual(len(self.gmail.sent), 1)
+        message = email.message_from_bytes(self.gmail.sent[0])
+        self.assertEqual(message['Subject'], 'Report')
+        text, attachment = message.get_payload()
+        self.assertEqual(text.get_payload(), 'See attached.')
+        with open(self.attachment, 'rb') as f:
+            self.assertEqual(attachment.get_payload(decode=True), f.read())
+
+    def test_small_message_is_one_request(self):
+        self.assertEqual(self.send(attachments=False), 'Email sent successfully! Message ID: s00001')
+        self.assertEqual(self.gmail.requests['upload_resumable'], 0)
+        self.assertEqual(self.gmail.requests['upload_media'] + self.gmail.requests['upload_multipart'], 1)
+        self.assertEqual(email.message_from_bytes(self.gmail.sent[0])['To'], 'you@example.com')
+
+    def test_resumes_from_the_server_offset(self):
+        self.gmail.fail_chunks = {3}
+        self.assertEqual(self.send(), 'Email sent successfully! Message ID: s00001')
+        self.assert_sent_intact()
+        # The third chunk got half way; the client asked and resent only the rest.
+        self.assertEqual(self.gmail.requests['upload_status'], 1)
+        self.assertEqual(self.gmail.chunk_starts[2:4], [2 * self.CHUNK, 2 * self.CHUNK + self.CHUNK // 2])
+        self.assertEqual(self.sleep.call_count, 1)
+
+    def test_upload_retries_are_bounded(self):
+        self.tool.MAX_RETRIES = 2
+        self.gmail.fail_chunks = set(range(1, 100))
+        self.assertTrue(self.send().startswith('Error sending email:'))
+        self.assertEqual(self.gmail.requests['upload_chunk'], 3)
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertEqual(self.gmail.sent, [])
+
+    def test_client_errors_are_not_retried(self):
+        self.gmail.fail_chunks = {2}
+        self.gmail.fail_status = 400
+        self.assertTrue(self.send().startswith('Error sending email:'))
+        self.assertEqual(self.gmail.requests['upload_chunk'], 2)
+        self.sleep.assert_not_called()
+
+    def test_large_message_is_spooled_to_disk(self):
+        spools = []
+
+        class Spool(gmail_tools.SpooledTemporaryFile):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                spools.append(self)
+
+        with mock.patch.object(gmail_tools, 'SpooledTemporaryFile', Spool):
+            self.assertEqual(self.send(), 'Email sent successfully! Message ID: s00001')
+        self.assertEqual(len(spools), 1)
+        self.assertTrue(spools[0]._rolled)
+        self.assertEqual(self.gmail.requests['upload_resumable'], 1)
+        self.assertEqual(self.gmail.requests['upload_chunk'], 6)
+        self.assert_sent_intact()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import datetime
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from google.auth.exceptions import RefreshError
+from tools import googles_apis
+from tools.googles_apis import TokenRefresher, clear_services, create_service
+
+
+class FakeClock:
+    """
+    Advances by each wait instead of sleeping. Once `steps` waits have gone by,
+    the next one blocks until the event is set (i.e. the refresher is stopped).
+    """
+
+    def __init__(self, steps):
+        self.time = datetime.datetime(2024, 1, 1)
+        self.steps = steps
+        self.waits = []
+        self.blocked = threading.Event()
+
+    def now(self):
+        return self.time
+
+    def wait(self, event, seconds):
+        self.waits.append(seconds)
+        if len(self.waits) > self.steps:
+            self.blocked.set()
+            return event.wait()
+        self.time += datetime.timedelta(seconds=seconds)
+        return event.is_set()
+
+
+class FakeCredentials:
+    """Credentials valid for `lifetime` seconds; refreshing renews them for as long."""
+
+    def __init__(self, clock, lifetime, errors=()):
+        self.clock = clock
+        self.lifetime = lifetime
+        self.errors = list(errors)
+        self.expiry = clock.now() + datetime.timedelta(seconds=lifetime)
+        self.refresh_token = 'refresh'
+        self.token = 'token-0'
+        self.valid = True
+        self.refreshed_at = []
+
+    def refresh(self, request):
+        self.refreshed_at.append(self.clock.now())
+        if self.errors:
+            raise self.errors.pop(0)
+        self.token = f'token-{len(self.refreshed_at)}'
+        self.expiry = self.clock.now() + datetime.timedelta(seconds=self.lifetime)
+
+    def to_json(self):
+        return json.dumps({'token': self.token, 'expiry': self.expiry.isoformat()})
+
+
+class TokenRefresherTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.token_path = os.path.join(directory.name, 'token.json')
+
+    def start(self, clock, creds):
+        refresher = TokenRefresher(creds, self.token_path, margin=300, clock=clock)
+        refresher.start()
+        self.addCleanup(refresher.join, 5)
+        self.addCleanup(refresher.stop)
+        return refresher
+
+    def saved_token(self):
+        with open(self.token_path) as f:
+            return json.load(f)['token']
+
+    def test_refreshes_before_expiry(self):
+        clock = FakeClock(steps=1)
+        creds = FakeCredentials(clock, lifetime=3600)
+        expiry = creds.expiry
+        self.start(clock, creds)
+        self.assertTrue(clock.blocked.wait(5))
+        self.assertEqual(creds.refreshed_at, [expiry - datetime.timedelta(seconds=300)])
+        self.assertEqual(clock.waits, [3300, 3300])
+        self.assertEqual(self.saved_token(), 'token-1')
+
+    def test_short_lived_tokens_are_not_refreshed_in_a_loop(self):
+        clock = FakeClock(steps=3)
+        creds = FakeCredentials(clock, lifetime=60)
+        self.start(clock, creds)
+        self.assertTrue(clock.blocked.wait(5))
+        self.assertEqual(clock.waits, [0.0, 30.0, 30.0, 30.0])
+        self.assertEqual(len(creds.refreshed_at), 3)
+        self.assertEqual(self.saved_token(), 'token-3')
+
+    def test_transport_errors_back_off(self):
+        clock = FakeClock(steps=5)
+        creds = FakeCredentials(clock, lifetime=3600, errors=[OSError('reset'), OSError('reset')])
+        self.start(clock, creds)
+        self.assertTrue(clock.blocked.wait(5))
+        # Backoff waits between the attempts, which are due right away once inside the margin.
+        self.assertEqual(clock.waits, [3300, 2, 0.0, 4, 0.0, 3300])
+        self.assertEqual(self.saved_token(), 'token-3')
+
+    def test_refresh_error_stops_the_thread(self):
+        clock = FakeClock(steps=1)
+        creds = FakeCredentials(clock, lifetime=3600, errors=[RefreshError('revoked')])
+        refresher = self.start(clock, creds)
+        refresher.join(5)
+        self.assertFalse(refresher.is_alive())
+        self.assertFalse(os.path.exists(self.token_path))
+
+    def test_stop_ends_a_pending_wait(self):
+        clock = FakeClock(steps=0)
+        refresher = self.start(clock, FakeCredentials(clock, lifetime=3600))
+        self.assertTrue(clock.blocked.wait(5))
+        refresher.stop()
+        refresher.join(5)
+        self.assertFalse(refresher.is_alive())
+        self.assertEqual(clock.waits, [3300])
+
+
+class ServiceRegistryTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Token files are kept under the working directory.
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        self.addCleanup(clear_services)
+
+    def test_services_are_cached(self):
+        with mock.patch.object(googles_apis, '_build_service', side_effect=lambda *args: object()) as build:
+            service = create_service('secret.json', 'gmail', 'v1', ['a', 'b'])
+            self.assertIs(create_service('secret.json', 'gmail', 'v1', ['b', 'a']), service)
+            self.assertIsNot(create_service('secret.json', 'gmail', 'v1', ['a', 'b'], prefix='_x'), service)
+            self.assertEqual(build.call_count, 2)
+            clear_services()
+            self.assertIsNot(create_service('secret.json', 'gmail', 'v1', ['a', 'b']), service)
+            self.assertEqual(build.call_count, 3)
+
+    def test_failed_builds_are_not_cached(self):
+        with mock.patch.object(googles_apis, '_build_service', return_value=None) as build:
+            self.assertIsNone(create_service('secret.json', 'gmail', 'v1', ['a']))
+            self.assertIsNone(create_service('secret.json', 'gmail', 'v1', ['a']))
+            self.assertEqual(build.call_count, 2)
+
+    def test_refreshers_are_replaced_and_stopped(self):
+        os.makedirs('token files')
+        token_path = os.path.join(os.getcwd(), 'token files', 'token_gmail_v1.json')
+        with open(token_path, 'w') as f:
+            f.write('{}')
+        creds = FakeCredentials(googles_apis.SystemClock(), lifetime=3600)
+        with mock.patch('google.oauth2.credentials.Credentials.from_authorized_user_file', return_value=creds), \
+                mock.patch('googleapiclient.discovery.build', side_effect=lambda *args, **kwargs: object()):
+            create_service('secret.json', 'gmail', 'v1', ['a'])
+            first = googles_apis._refreshers[token_path]
+            self.assertTrue(first.is_alive())
+            # Another service on the same token file takes over its refresher.
+            create_service('secret.json', 'gmail', 'v1', ['a', 'b'])
+            second = googles_apis._refreshers[token_path]
+        first.join(5)
+        self.assertFalse(first.is_alive())
+        self.assertTrue(second.is_alive())
+
+        clear_services()
+        second.join(5)
+        self.assertFalse(second.is_alive())
+        self.assertEqual(googles_apis._refreshers, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
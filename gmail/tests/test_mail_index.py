@@ -0,0 +1,165 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fake_gmail import FakeGmail, make_message, make_tool
+from tools.gmail_tools import EmailMessages
+from tools.mail_index import parse_query
+
+
+class ParseQueryTest(unittest.TestCase):
+    def test_field_and_label_operators(self):
+        self.assertEqual(
+            parse_query('from:alice is:starred in:sent'),
+            ('sender : "alice"', ['STARRED', 'SENT'])
+        )
+        self.assertEqual(parse_query('subject:"q3 report"'), ('subject : "q3 report"', []))
+        self.assertEqual(parse_query(None), (None, []))
+
+    def test_grouped_field_values(self):
+        self.assertEqual(
+            parse_query('subject:(foo "bar baz")'),
+            ('subject : "foo" AND subject : "bar baz"', [])
+        )
+        self.assertIsNone(parse_query('subject:(foo OR bar)'))
+        self.assertIsNone(parse_query('subject:(foo'))
+
+    def test_free_text_goes_to_the_api(self):
+        # Gmail also matches free text against bodies, which the index lacks.
+        self.assertIsNone(parse_query('invoice'))
+        self.assertIsNone(parse_query('from:alice invoice'))
+        self.assertIsNone(parse_query('has:attachment'))
+
+
+class MailIndexSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.gmail = FakeGmail(count=30).start()
+        self.addCleanup(self.gmail.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tool = make_tool(self.gmail, index_path=os.path.join(directory.name, 'index.db'), sync_interval=0)
+        self.addCleanup(self.tool.index.close)
+        self.addCleanup(self.wait_for_sync)
+
+    def wait_for_sync(self):
+        if self.tool._sync_thread is not None:
+            self.tool._sync_thread.join()
+
+    def local_search(self, query=None):
+        lists = self.gmail.requests['list']
+        page = self.tool.search_email_page(query, max_results=100)
+        self.assertEqual(self.gmail.requests['list'], lists, 'expected the index to answer')
+        return [message.msg_id for message in page.messages]
+
+    def test_first_sync_runs_in_the_background(self):
+        page = self.tool.search_email_page('is:starred', max_results=5)
+        # Served by the API (Gmail page tokens) while the index is built.
+        self.assertEqual(page.count, 5)
+        self.assertFalse(page.next_page_token.startswith('local:'))
+        self.wait_for_sync()
+        self.assertEqual(self.tool.index.history_id, '5000')
+        self.assertEqual(self.local_search('is:starred'), ['m00028', 'm00021', 'm00014', 'm00007', 'm00000'])
+
+    def test_full_sync(self):
+        stats = self.tool.sync_index()
+        self.assertEqual(stats, {'updated': 30, 'deleted': 0, 'full': True})
+        self.assertEqual(self.local_search()[:3], ['m00029', 'm00028', 'm00027'])
+        self.assertEqual(self.local_search('subject:(subject 7)'), ['m00007'])
+        self.assertEqual(self.tool.get_email_message_details('m00007').subject, 'Subject 7')
+
+    def test_history_delta(self):
+        self.tool.sync_index()
+        self.gmail.modify('m00001', add=['STARRED'])
+        self.gmail.modify('m00007', remove=['STARRED'])
+        self.gmail.remove('m00002')
+        new = make_message(98)
+        new['id'] = 'm09999'
+        self.gmail.add(new)
+        lists = self.gmail.requests['list']
+
+        stats = self.tool.sync_index()
+        self.assertEqual(stats, {'updated': 3, 'deleted': 1, 'full': False})
+        self.assertEqual(self.gmail.requests['list'], lists)
+        self.assertEqual(self.tool.index.history_id, str(self.gmail.history_id))
+        self.assertEqual(self.local_search('is:starred'), ['m09999', 'm00028', 'm00021', 'm00014', 'm00001', 'm00000'])
+        self.assertIsNone(self.tool.index.get('m00002'))
+        self.assertTrue(self.tool.get_email_message_details('m00001').star)
+
+    def test_expired_history_resyncs(self):
+        self.tool.sync_index()
+        self.gmail.remove('m00003')
+        self.gmail.min_history_id = self.gmail.history_id
+
+        stats = self.tool.sync_index()
+        self.assertEqual(stats, {'updated': 29, 'deleted': 0, 'full': True})
+        self.assertNotIn('m00003', self.local_search())
+
+    def test_expired_history_resyncs_in_the_background(self):
+        self.tool.sync_index()
+        self.gmail.remove('m00004')
+        self.gmail.min_history_id = self.gmail.history_id
+
+        page = self.tool.search_email_page(max_results=10)
+        self.assertFalse(page.next_page_token.startswith('local:'))
+        self.assertNotIn('m00004', [message.msg_id for message in page.messages])
+        self.wait_for_sync()
+        self.assertEqual(len(self.local_search()), 29)
+
+
+class LocalPageTokenTest(unittest.TestCase):
+    def setUp(self):
+        self.gmail = FakeGmail(count=30).start()
+        self.addCleanup(self.gmail.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tool = make_tool(self.gmail, index_path=os.path.join(directory.name, 'index.db'), sync_interval=0)
+        self.addCleanup(self.tool.index.close)
+        self.tool.sync_index()
+        self.lists = self.gmail.requests['list']
+
+    def test_token_round_trip(self):
+        msg_ids, token, pages = [], None, 0
+        while True:
+            page = EmailMessages.model_validate_json(self.tool.search_emails('is:starred', 'INBOX', 2, token))
+            msg_ids += [message.msg_id for message in page.messages]
+            pages += 1
+            token = page.next_page_token
+            if token is None:
+                break
+            self.assertTrue(token.startswith('local:'))
+        # The last page is short and carries no token.
+        self.assertEqual(pages, 3)
+        self.assertEqual(page.count, 1)
+        self.assertEqual(msg_ids, ['m00028', 'm00021', 'm00014', 'm00007', 'm00000'])
+        self.assertEqual(self.gmail.requests['list'], self.lists)
+
+    def test_exact_last_page_has_no_token(self):
+        page = self.tool.search_email_page('is:starred', max_results=5)
+        self.assertEqual(page.count, 5)
+        self.assertIsNone(page.next_page_token)
+
+    def test_foreign_token_is_an_error(self):
+        token = self.tool.search_email_page('is:starred', max_results=2).next_page_token
+        for query, label, bad in ((None, 'INBOX', token), ('is:starred', 'SENT', token), ('is:starred', 'INBOX', 'local:nope')):
+            result = self.tool.search_emails(query, label, 2, bad)
+            self.assertTrue(result.startswith('Error searching emails: Page token'), result)
+        with self.assertRaises(ValueError):
+            self.tool.search_email_page(None, max_results=2, page_token=token)
+
+    def test_stale_token_is_an_error(self):
+        token = self.tool.search_email_page('is:starred', max_results=2).next_page_token
+        with mock.patch.object(self.tool, '_index_ready', return_value=False):
+            result = self.tool.search_emails('is:starred', 'INBOX', 2, token)
+        self.assertTrue(result.startswith('Error searching emails:'), result)
+        self.assertIn('search again', result)
+        self.assertEqual(self.gmail.requests['list'], self.lists)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1 +1,2 @@
-from .gmail_tools import GmailTool
\ No newline at end of file
+from .gmail_tools import GmailTool
+from .mail_index import MailIndex
@@ -1,12 +1,24 @@
 import os
+import time
+import uuid
 import base64
-from typing import Literal, Optional, List
+import hashlib
+import random
+import logging
+import threading
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import Iterator, Literal, Optional, List
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
+from email import message as mime_message
+from email.policy import SMTP
 from pydantic import BaseModel, Field
-from .googles_apis import create_service
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+from .googles_apis import create_service, thread_http
+from .mail_index import MailIndex
+from .message_cache import MessageCache
 
 class EmailMessage(BaseModel):
     msg_id: str = Field(..., description="The ID of the email message.")
@@ -26,15 +38,60 @@ class EmailMessages(BaseModel):
     next_page_token: str | None = Field(..., description="Token for the next page of results.")
 
 
+LOCAL_TOKEN = 'local:'
+
+logger = logging.getLogger(__name__)
+
+
+def _is_retryable(error: HttpError) -> bool:
+    """True for rate-limit and transient server errors, which are worth retrying."""
+    status = getattr(error.resp, 'status', None)
+    if status in (429, 500, 502, 503, 504):
+        return True
+    return status == 403 and b'ratelimitexceeded' in (error.content or b'').lower()
+
+
 #connects to gmail API server - creates a service object
 class GmailTool:
     API_NAME = 'gmail'
     API_VERSION = 'v1'
     SCOPES = ["https://mail.google.com/"]
+    METADATA_HEADERS = ['Subject', 'From', 'To', 'Date']
+    # Gmail accepts up to 100 calls per batch, but throttles large batches.
+    BATCH_SIZE = 50
+    # Upper bound on the messages returned (and held in memory) per page.
+    PAGE_LIMIT = 500
+    # Messages above RESUMABLE_THRESHOLD are uploaded in UPLOAD_CHUNK_SIZE
+    # pieces (a multiple of 256 KB) that can be retried individually.
+    RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+    SPOOL_SIZE = 1024 * 1024
+    MAX_RETRIES = 5
 	
 #
-    def __init__(self, client_secret_file: str) -> None:
+    def __init__(
+        self,
+        client_secret_file: str,
+        index_path: Optional[str] = None,
+        sync_interval: float = 10.0,
+        cache_bytes: int = 32 * 1024 * 1024
+    ) -> None:
+        """
+        Args:
+            client_secret_file (str): Path to the client secret JSON file.
+            index_path (str): Optional SQLite file for a local MailIndex. When set,
+                searches and message details are served from it once its first
+                full sync, run in a background thread, has completed.
+            sync_interval (float): Minimum seconds between two index syncs.
+            cache_bytes (int): Size limit of the MessageCache of fetched messages.
+        """
         self.client_secret_file = client_secret_file
+        self.index = MailIndex(index_path) if index_path else None
+        self.sync_interval = sync_interval
+        self._last_sync = None
+        self._sync_thread = None
+        self._sync_lock = threading.Lock()
+        self.cache = MessageCache(cache_bytes)
         self._init_service()
 
 #
@@ -69,50 +126,140 @@ class GmailTool:
             attachments_paths (list): List of file paths for attachments.
 
         Returns:
-        dict: Response from the Gmail API after sending the email.
+        str: The sent message's ID, or the error.
 		"""
+        if body_type.lower()  not in ['plain', 'html']:
+            return {'error': 'Invalid body type. Use "plain" or "html".'}
+        for attachment_path in attachments_paths or []:
+            if not os.path.exists(attachment_path):
+                return f'File not found - {attachment_path}'
+
         try:
-            message = MIMEMultipart()
-            message['to'] = to
-            message['subject'] = subject
-            
-            if body_type.lower()  not in ['plain', 'html']:
-                return {'error': 'Invalid body type. Use "plain" or "html".'}
-            
-            message.attach(MIMEText(body, body_type.lower()))
-            
-            if attachments_paths:
-                for attachment_path in attachments_paths:
-                    if os.path.exists(attachment_path):
-                        filename = os.path.basename(attachment_path)
-
-                        with open(attachment_path, "rb") as attachment:
-                            part = MIMEBase("application", "octet-stream")
-                            part.set_payload(attachment.read())
-                                
-                        encoders.encode_base64(part)
-
-                        part.add_header(
-            				"Content-Disposition",
-            				f"attachment; filename= {filename}",
-                        )
-
-                        message.attach(part)
-                    else:
-                        return f'File not found - {attachment_path}'
-
-            raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-
-            response = self.service.users().messages().send(
-    			userId="me",
-    			body={"raw": raw_message}
-			).execute()
+            # The MIME message is written to a spooled temp file (memory first,
+            # disk once large) and uploaded as message/rfc822 media, instead of
+            # being held in memory and base64-encoded again as 'raw'.
+            with SpooledTemporaryFile(max_size=self.SPOOL_SIZE) as message:
+                size = self._write_mime(message, to, subject, body, body_type.lower(), attachments_paths or [])
+                message.seek(0)
+                media = MediaIoBaseUpload(
+                    message,
+                    mimetype='message/rfc822',
+                    chunksize=self.UPLOAD_CHUNK_SIZE,
+                    resumable=size > self.RESUMABLE_THRESHOLD
+                )
+                request = self.service.users().messages().send(userId='me', media_body=media)
+                http = self._thread_http()
+                if media.resumable():
+                    response = self._upload_resumable(request, http)
+                else:
+                    response = request.execute(http=http, num_retries=self.MAX_RETRIES)
 
             return f"Email sent successfully! Message ID: {response['id']}"
 
         except Exception as e:
             return f"Error sending email: {str(e)}"
 
+#
+    def _upload_resumable(self, request, http) -> dict:
+        """
+        Uploads a resumable media request chunk by chunk. After a failed chunk
+        the request asks the server how much it has and resumes from there.
+        """
+        # next_chunk(num_retries=...) re-sends an already consumed stream slice,
+        # so retries are done here instead.
+        response = None
+        attempt = 0
+        while response is None:
+            try:
+                _, response = request.next_chunk(http=http)
+                attempt = 0
+            except (HttpError, OSError) as e:
+                if isinstance(e, HttpError) and not _is_retryable(e) or attempt == self.MAX_RETRIES:
+                    raise
+                time.sleep(min(2 ** attempt, 32) + random.random())
+                attempt += 1
+        return response
+
+#
+    def send_emails(
+        self,
+        messages: List[dict],
+        max_workers: int = 4
+    ) -> List[str]:
+        """
+        Sends several emails concurrently, at most max_workers at a time.
+
+        Args:
+            messages (list): send_email keyword arguments for each email,
+                e.g. {'to': ..., 'subject': ..., 'body': ...}.
+            max_workers (int): Maximum number of emails in flight.
+
+        Returns:
+            list: The send_email result for each email, in order.
+        """
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            return list(pool.map(lambda message: self.send_email(**message), messages))
+
+#
+    def _thread_http(self):
+        """
+        Returns this thread's authorized HTTP transport; httplib2 connections
+        cannot be shared between threads.
+        """
+        return thread_http(self.service)
+
+#
+    def _write_mime(
+        self,
+        fh,
+        to: str,
+        subject: str,
+        body: str,
+        body_type: str,
+        attachments_paths: List[str]
+    ) -> int:
+        """
+        Writes a multipart/mixed message to fh, base64-encoding attachments
+        chunk by chunk straight from their files.
+
+        Returns:
+            int: The number of bytes written.
+        """
+        boundary = f'=={uuid.uuid4().hex}=='
+        headers = mime_message.EmailMessage(policy=SMTP)
+        headers['To'] = to
+        headers['Subject'] = subject
+        headers['MIME-Version'] = '1.0'
+        headers['Content-Type'] = f'multipart/mixed; boundary="{boundary}"'
+        self._write_headers(fh, headers)
+        fh.write(f'--{boundary}\r\n'.encode())
+        fh.write(MIMEText(body, body_type).as_bytes(policy=SMTP))
+
+        for attachment_path in attachments_paths:
+            mimetype, encoding = mimetypes.guess_type(attachment_path)
+            if mimetype is None or encoding is not None:
+                mimetype = 'application/octet-stream'
+            headers = mime_message.EmailMessage(policy=SMTP)
+            headers['Content-Type'] = mimetype
+            headers['Content-Transfer-Encoding'] = 'base64'
+            headers.add_header('Content-Disposition', 'attachment', filename=os.path.basename(attachment_path))
+            fh.write(f'\r\n--{boundary}\r\n'.encode())
+            self._write_headers(fh, headers)
+            with open(attachment_path, 'rb') as attachment:
+                # 57-byte multiples encode to whole 76-character lines.
+                while chunk := attachment.read(57 * 1024):
+                    fh.write(base64.encodebytes(chunk).replace(b'\n', b'\r\n'))
+
+        fh.write(f'\r\n--{boundary}--\r\n'.encode())
+        return fh.tell()
+
+#
+    def _write_headers(self, fh, headers: mime_message.EmailMessage) -> None:
+        # Folded and RFC 2047/2231-encoded as needed, then the blank line.
+        for name, value in headers.items():
+            fh.write(SMTP.fold_binary(name, value))
+        fh.write(b'\r\n')
+
 #
     def search_emails(
 		self,
@@ -129,53 +276,318 @@ class GmailTool:
 			label (str): Label to filter emails. Default is 'INBOX'.
 			    Available labels: 'ALL', 'INBOX', 'SENT', 'DRAFT', 'SPAM', 'TRASH'.
             max_results (int): Maximum number of results to return. Default is 100.
+                None returns one full page of PAGE_LIMIT messages.
+            next_page_token (str): Token from a previous call, to continue where it stopped.
+
+        Returns:
+            str: EmailMessages JSON for one page; its next_page_token is None on the last page.
+                An error message if the page could not be fetched, e.g. for a stale token.
         """
-        
-        messages=[]
-        next_page_token = next_page_token 
-        
+        try:
+            return self.search_email_page(query, label, max_results, next_page_token).model_dump_json()
+        except Exception as e:
+            return f"Error searching emails: {str(e)}"
+
+#
+    def iter_email_pages(
+        self,
+        query: Optional[str] = None,
+        label: str = 'INBOX',
+        page_size: int = 100,
+        page_token: Optional[str] = None
+    ) -> Iterator[EmailMessages]:
+        """
+        Yields search results one page at a time, following next_page_token.
+
+        Only the current page is held in memory, so a whole label can be
+        scanned regardless of its size.
+
+        Args:
+            query (str): Search query to filter emails.
+            label (str): Label to filter emails, as in search_emails.
+            page_size (int): Number of messages per page.
+            page_token (str): Token to start from, e.g. from an earlier scan.
+        """
+        while True:
+            page = self.search_email_page(query, label, page_size, page_token)
+            yield page
+            page_token = page.next_page_token
+            if not page_token:
+                return
+
+#
+    def iter_emails(
+        self,
+        query: Optional[str] = None,
+        label: str = 'INBOX',
+        page_size: int = 100
+    ) -> Iterator[EmailMessage]:
+        """
+        Yields every matching message, fetching page_size at a time.
+        """
+        for page in self.iter_email_pages(query, label, page_size):
+            yield from page.messages
+
+#
+    def search_email_page(
+        self,
+        query: Optional[str] = None,
+        label: str = 'INBOX',
+        max_results: Optional[int] = 100,
+        page_token: Optional[str] = None
+    ) -> EmailMessages:
+        """
+        Returns one page of search results, from the local index when it can
+        answer the query and from the Gmail API otherwise.
+
+        Pages served by the index carry 'local:<search>:<offset>' tokens; any
+        other token is a Gmail nextPageToken.
+
+        Raises:
+            ValueError: A local token from another search, or one whose index
+                snapshot is gone (the index is being rebuilt).
+        """
+        max_results = min(max_results or self.PAGE_LIMIT, self.PAGE_LIMIT)
+        local = page_token is not None and page_token.startswith(LOCAL_TOKEN)
+        offset = self._local_offset(page_token, query, label) if local else 0
+
+        if self.index is not None and (page_token is None or local):
+            # Later pages keep the snapshot the first one saw, so offsets stay valid.
+            found = self.index.search(query, label, max_results + 1, offset) \
+                if self._index_ready(sync=offset == 0) else None
+            if found is not None:
+                email_messages = [self._to_email_message(message) for message in found[:max_results]]
+                return EmailMessages(
+                    count=len(email_messages),
+                    messages=email_messages,
+                    next_page_token=self._local_token(query, label, offset + max_results)
+                        if len(found) > max_results else None
+                )
+            if local:
+                raise ValueError(f'Page token {page_token!r} has expired while the index is rebuilt; search again')
+
         if label == 'ALL':
             label_ = None
         else:
             label_=[label]
-        
-		#500 items per request
+
+        #500 items per request
+        messages = []
         while True:
             result = self.service.users().messages().list(
-				userId='me',
-				q=query,
-				labelIds=label_,
-				maxResults=min(500, max_results-len(messages)) if max_results else 500,
-			).execute()
-            
+                userId='me',
+                q=query,
+                labelIds=label_,
+                maxResults=min(500, max_results - len(messages)),
+                pageToken=page_token
+            ).execute()
+
             messages.extend(result.get('messages', []))
-			
-            next_page_token = result.get('nextPageToken')
-            if not next_page_token or (max_results and len(messages) >= max_results):
+
+            page_token = result.get('nextPageToken')
+            if not page_token or len(messages) >= max_results:
                 break
-			
-		# compile emails details
-        email_messages = []
-        for message in messages:
-            msg_id = message['id']
-            msg_details = self.get_email_message_details(msg_id)
-            email_messages.append(msg_details)
 
-        email_messages_ = email_messages[:max_results] if max_results else email_messages
+        # compile emails details
+        email_messages = self.get_email_messages_metadata([message['id'] for message in messages])
 
         return EmailMessages(
-            count=len(email_messages_),
-            messages=email_messages_,
-            next_page_token=next_page_token
-        ).model_dump_json()
+            count=len(email_messages),
+            messages=email_messages,
+            next_page_token=page_token
+        )
+
+#
+    def _local_token(self, query: Optional[str], label: str, offset: int) -> str:
+        # Tagged with the search it belongs to, so it is not replayed against another one.
+        search = hashlib.sha1(f'{label}\0{query or ""}'.encode('utf-8')).hexdigest()[:12]
+        return f'{LOCAL_TOKEN}{search}:{offset}'
+
+    def _local_offset(self, page_token: str, query: Optional[str], label: str) -> int:
+        offset = page_token.rpartition(':')[2]
+        if self.index is None or not offset.isdigit() or page_token != self._local_token(query, label, int(offset)):
+            raise ValueError(f'Page token {page_token!r} does not belong to this search')
+        return int(offset)
 
 #
     def get_email_message_details(
         self,
         msg_id: str
     ) -> EmailMessage:
-        message = self.service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-        payload = message['payload']
+        if self._index_ready():
+            message = self.index.get(msg_id)
+            if message is not None:
+                return self._to_email_message(message)
+        history_id = None
+        if msg_id in self.cache:
+            # Labels (star, read state) change without the body changing; a
+            # 'minimal' get is enough to tell whether the cached copy is current.
+            history_id = self.service.users().messages().get(
+                userId='me', id=msg_id, format='minimal', fields='historyId'
+            ).execute()['historyId']
+        return self._to_email_message(self._get_full_message(msg_id, history_id))
+
+#
+    def _get_full_message(self, msg_id: str, history_id: Optional[str] = None) -> dict:
+        """
+        Returns the 'full' message resource, from the MessageCache when it holds
+        this message (at `history_id`, if given) and from the API otherwise.
+        """
+        message = self.cache.get(msg_id, history_id)
+        if message is None:
+            message = self.service.users().messages().get(userId='me', id=msg_id, format='full').execute()
+            self.cache.put(message)
+        return message
+
+#
+    def sync_index(self, force: bool = False, background: bool = False) -> Optional[dict]:
+        """
+        Brings the local MailIndex up to date, at most once every sync_interval seconds.
+
+        Args:
+            force (bool): Sync even if the last sync was recent.
+            background (bool): Start a needed full sync (the first one, or after
+                Gmail expired the stored history) in a background thread instead
+                of waiting for it.
+
+        Returns:
+            dict: Sync counts from MailIndex.sync, or None if no sync ran here.
+        """
+        if self.index is None:
+            return None
+        if self._full_sync_running():
+            if background:
+                return None
+            self._sync_thread.join()
+        if not force and self._last_sync is not None and time.monotonic() - self._last_sync < self.sync_interval:
+            return None
+        stats = self.index.sync(self, full=not background)
+        if stats is None:
+            self._start_full_sync()
+            return None
+        self._last_sync = time.monotonic()
+        return stats
+
+#
+    def _index_ready(self, sync: bool = True) -> bool:
+        """
+        Whether the local index can answer queries, after syncing it if due.
+        Until a full sync has completed, searches and details use the API.
+        """
+        if self.index is None:
+            return False
+        if sync:
+            self.sync_index(background=True)
+        return not self._full_sync_running() and self.index.history_id is not None
+
+    def _full_sync_running(self) -> bool:
+        return self._sync_thread is not None and self._sync_thread.is_alive()
+
+    def _start_full_sync(self) -> None:
+        with self._sync_lock:
+            if not self._full_sync_running():
+                self._sync_thread = threading.Thread(target=self._full_sync, name='mail-index-sync', daemon=True)
+                self._sync_thread.start()
+
+    def _full_sync(self) -> None:
+        # Listing a large mailbox takes minutes; requests meanwhile go to the API.
+        try:
+            self.index.full_sync(self)
+        except Exception:
+            logger.exception('Mail index sync failed; searches use the Gmail API until it is retried')
+        finally:
+            # A failed sync is retried after sync_interval, not on every request.
+            self._last_sync = time.monotonic()
+
+#
+    def get_email_messages_metadata(
+        self,
+        msg_ids: List[str]
+    ) -> List[EmailMessage]:
+        """
+        Fetches the headers of several email messages with batched API requests.
+
+        Messages are requested BATCH_SIZE at a time in one HTTP round trip each,
+        with format='metadata' and only the headers in METADATA_HEADERS. Calls
+        that hit a rate limit are retried with exponential backoff; messages
+        deleted since they were listed are skipped.
+
+        Args:
+            msg_ids (list): The IDs of the email messages.
+
+        Returns:
+            list: EmailMessage objects in the order of msg_ids.
+        """
+        fetched = self.fetch_messages_metadata(msg_ids)
+        return [self._to_email_message(fetched[msg_id]) for msg_id in msg_ids if msg_id in fetched]
+
+#
+    def fetch_messages_metadata(self, msg_ids: List[str]) -> dict:
+        """
+        Fetches 'metadata' message resources as described in get_email_messages_metadata.
+
+        Returns:
+            dict: Message resources by ID; deleted messages are missing.
+        """
+        fetched = {}
+        unique_ids = list(dict.fromkeys(msg_ids))
+        for start in range(0, len(unique_ids), self.BATCH_SIZE):
+            pending = unique_ids[start:start + self.BATCH_SIZE]
+            for attempt in range(self.MAX_RETRIES + 1):
+                pending = self._execute_metadata_batch(pending, fetched)
+                if not pending:
+                    break
+                if attempt == self.MAX_RETRIES:
+                    raise RuntimeError(f'Gmail rate limit still exceeded after {self.MAX_RETRIES} retries')
+                time.sleep(min(2 ** attempt, 32) + random.random())
+        for msg_id, message in fetched.items():
+            self.cache.observe(msg_id, message.get('historyId'))
+        return fetched
+
+#
+    def _execute_metadata_batch(self, msg_ids: List[str], fetched: dict) -> List[str]:
+        """
+        Sends one batch of metadata requests, storing responses in `fetched`.
+
+        Returns:
+            list: The IDs to retry because of a rate limit or server error.
+        """
+        retry = []
+        errors = []
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                fetched[request_id] = response
+            elif _is_retryable(exception):
+                retry.append(request_id)
+            elif getattr(exception.resp, 'status', None) != 404:
+                errors.append(exception)
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        for msg_id in msg_ids:
+            batch.add(
+                self.service.users().messages().get(
+                    userId='me', id=msg_id, format='metadata', metadataHeaders=self.METADATA_HEADERS
+                ),
+                request_id=msg_id
+            )
+        try:
+            batch.execute(http=self._thread_http())
+        except HttpError as e:
+            if not _is_retryable(e):
+                raise
+            return [msg_id for msg_id in msg_ids if msg_id not in fetched]
+        if errors:
+            raise errors[0]
+        return [msg_id for msg_id in msg_ids if msg_id in retry]
+
+#
+    def _to_email_message(self, message: dict) -> EmailMessage:
+        """
+        Builds an EmailMessage from a 'full' or 'metadata' Gmail message resource.
+        """
+        msg_id = message['id']
+        payload = message.get('payload', {})
         headers = payload.get('headers', [])
 
         subject = next((header['value'] for header in headers if header['name'].lower() == 'subject'), None)
@@ -185,7 +597,9 @@ class GmailTool:
         sender = next((header['value'] for header in headers if header['name'] == 'From'), 'No sender')
         recipients = next((header['value'] for header in headers if header['name'] == 'To'), 'No recipients')
         snippet = message.get('snippet', 'No snippet')
-        has_attachments = any(part.get('filename') for part in payload.get('parts', []) if part.get('filename'))
+        # 'metadata' responses carry no parts; a multipart/mixed message is one with attachments.
+        has_attachments = any(part.get('filename') for part in payload.get('parts', [])) \
+            or ('parts' not in payload and payload.get('mimeType') == 'multipart/mixed')
         date = next((header['value'] for header in headers if header['name'] == 'Date'), 'No date')
         star = message.get('labelIds', []).count('STARRED') > 0
         label = ', '.join(message.get('labelIds', []))
@@ -219,34 +633,45 @@ class GmailTool:
         Returns:
         str: The body of the email message.
         """
-        message = self.service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-        payload = message['payload']
-        return self._extract_body(payload)
+        # Bodies never change, so any cached version of the message will do.
+        message = self._get_full_message(msg_id)
+        return self._extract_body(message['payload'])
     
 #
     def _extract_body(self, payload:dict)->str:
         """
 		Extracts the body from the email payload.
 
+		Walks nested multipart trees depth-first and decodes only the first
+		text/plain part found; attachments are skipped.
+
 		Args:
 			payload (dict): The payload of the email message.
 
 		Returns:
 			str: The extracted body of the email.
 		"""
-        body = '<Text body not available>'
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'multipart/alternative':
-                    for subpart in part['parts']:
-                        if subpart['mimeType'] == 'text/plain' and 'data' in subpart['body']:
-                            body = base64.urlsafe_b64decode(subpart['body']['data']).decode('utf-8')
-                            break
-                elif part['mimeType'] == 'text/plain' and 'data' in part['body']:	
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-        elif 'body' in payload and 'data' in payload['body']:
-            body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
-        return body
+        part = self._find_text_part(payload)
+        if part is None and 'parts' not in payload and 'data' in payload.get('body', {}):
+            # A single-part message, e.g. text/html only.
+            part = payload
+        if part is None:
+            return '<Text body not available>'
+        return base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='replace')
+
+#
+    def _find_text_part(self, part: dict) -> Optional[dict]:
+        if part.get('filename'):
+            return None
+        if 'parts' in part:
+            for subpart in part['parts']:
+                found = self._find_text_part(subpart)
+                if found is not None:
+                    return found
+            return None
+        if part.get('mimeType', 'text/plain') == 'text/plain' and 'data' in part.get('body', {}):
+            return part
+        return None
     
 #
     def delete_email_message(
@@ -264,6 +689,9 @@ class GmailTool:
         """
         try:
             self.service.users().messages().delete(userId='me', id=msg_id).execute()
+            if self.index is not None:
+                self.index.delete([msg_id])
+            self.cache.invalidate(msg_id)
             return f"Email with ID '{msg_id}' successfully deleted."
         except Exception as e:
             return f"Error deleting email with ID '{msg_id}': {str(e)}"
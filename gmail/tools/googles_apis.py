@@ -1,54 +1,214 @@
 import os
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
+import datetime
+import threading
+
+# Refresh access tokens this many seconds before they expire.
+REFRESH_MARGIN = 300
+
+# Built services by (client secret, API, version, scopes, prefix), and the
+# background refresher of each token file.
+_services = {}
+_refreshers = {}
+_lock = threading.Lock()
+_local = threading.local()
+_auth_request = None
 
 #pass API NAME,API VERSION,.. - set permisions - simmplifies google API service creation
 def create_service(client_secret_file, api_name, api_version, *scopes,prefix=''):
 	"""
 	Create a Google API service instance.
 
-	Args: 
+	Services are cached, so repeated calls with the same client secret, API,
+	version, scopes and prefix return the same instance and reuse its HTTP
+	connection. Its credentials are refreshed in the background before they
+	expire.
+
+	Args:
 		client_secret_file (str): Path to the client secret JSON file.
 		api_name (str): Name of the API to use (e.g., 'gmail').
 		api_version (str): Version of the API to use (e.g., 'v1').
 		scopes: Authorization Scopes for the API access.
 		prefix (str): Optional prefix for the file name.
-	
+
 	Returns:
 		Google API service instance or None if credentials are invalid.
 	"""
+	SCOPES = [scope for scope in scopes[0]]
+	key = (os.path.abspath(client_secret_file), api_name, api_version, tuple(sorted(SCOPES)), prefix)
+
+	with _lock:
+		service = _services.get(key)
+		if service is None:
+			service = _build_service(client_secret_file, api_name, api_version, SCOPES, prefix)
+			if service is not None:
+				_services[key] = service
+	return service
+
+def _build_service(client_secret_file, api_name, api_version, SCOPES, prefix):
+	# The Google client libraries take a few hundred ms to import, so they are
+	# loaded here rather than when the server starts.
+	from google_auth_oauthlib.flow import InstalledAppFlow
+	from googleapiclient.discovery import build
+	from google.oauth2.credentials import Credentials
 
 	CLIENT_SECRET_FILE=client_secret_file
 	API_SERVICE_NAME=api_name
 	API_VERSION=api_version
-	SCOPES = [scope for scope in scopes[0]]
 
 	creds=None
 	working_dir = os.getcwd()
 	token_dir='token files'
 	token_file=f'token_{API_SERVICE_NAME}_{API_VERSION}{prefix}.json'
+	token_path = os.path.join(working_dir, token_dir, token_file)
 
 	if not os.path.exists(os.path.join(working_dir, token_dir)):
 		os.makedirs(os.path.join(working_dir, token_dir))
 
-	if os.path.exists(os.path.join(working_dir, token_dir, token_file)):
-		creds = Credentials.from_authorized_user_file(os.path.join(working_dir, token_dir, token_file), SCOPES)
+	if os.path.exists(token_path):
+		creds = Credentials.from_authorized_user_file(token_path, SCOPES)
 
 	if not creds or not creds.valid:
 		if creds and creds.expired and creds.refresh_token:
-			creds.refresh(Request())
+			creds.refresh(auth_request())
 		else:
 			flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
 			creds = flow.run_local_server(port=0)
 
-		with open(os.path.join(working_dir, token_dir, token_file), 'w') as token:
-			token.write(creds.to_json())
+		save_token(token_path, creds)
 
 	try:
-		service = build(API_SERVICE_NAME, API_VERSION, credentials=creds,static_discovery=False)
-		return service
+		# Use the discovery document bundled with google-api-python-client
+		# instead of fetching it over the network on every start.
+		service = build(API_SERVICE_NAME, API_VERSION, credentials=creds,static_discovery=True)
 	except Exception as e:
-		os.remove(os.path.join(working_dir, token_dir, token_file))
-		return None
\ No newline at end of file
+		os.remove(token_path)
+		return None
+
+	if creds.refresh_token:
+		previous = _refreshers.pop(token_path, None)
+		if previous is not None:
+			previous.stop()
+		_refreshers[token_path] = TokenRefresher(creds, token_path)
+		_refreshers[token_path].start()
+	return service
+
+def auth_request():
+	"""
+	Returns the google-auth transport used for token refreshes. It wraps one
+	requests.Session, so refreshes reuse its connection pool.
+	"""
+	global _auth_request
+	if _auth_request is None:
+		import requests
+		from google.auth.transport.requests import Request
+		_auth_request = Request(session=requests.Session())
+	return _auth_request
+
+def save_token(token_path, creds):
+	"""
+	Writes the credentials to token_path atomically, so a crash or a concurrent
+	reader never sees a half-written token file.
+	"""
+	tmp_path = f'{token_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+	with open(tmp_path, 'w') as token:
+		token.write(creds.to_json())
+	os.replace(tmp_path, token_path)
+
+def thread_http(service):
+	"""
+	Returns this thread's HTTP transport for `service`, authorized with the
+	service's credentials.
+
+	httplib2 connections cannot be shared between threads, so each thread
+	builds one per service on first use and keeps reusing it.
+	"""
+	from googleapiclient.http import build_http
+	from google_auth_httplib2 import AuthorizedHttp
+
+	transports = getattr(_local, 'transports', None)
+	if transports is None:
+		transports = _local.transports = {}
+	http = transports.get(id(service))
+	if http is None:
+		shared = service._http
+		# build_http() keeps 308 (resumable upload "incomplete") from being followed as a redirect.
+		http = AuthorizedHttp(shared.credentials, http=build_http()) \
+			if isinstance(shared, AuthorizedHttp) else build_http()
+		transports[id(service)] = http
+	return http
+
+def clear_services():
+	"""
+	Forgets every cached service and stops the background token refreshers.
+	"""
+	with _lock:
+		for refresher in _refreshers.values():
+			refresher.stop()
+		_refreshers.clear()
+		_services.clear()
+
+
+class SystemClock:
+	"""
+	The time source of TokenRefresher: the current time, and waits on its stop event.
+	"""
+
+	def now(self):
+		# google-auth keeps expiry as a naive UTC datetime.
+		return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+	def wait(self, event, seconds):
+		"""Waits up to `seconds` for `event`; True if it was set."""
+		return event.wait(seconds)
+
+
+#keeps a token fresh - requests never wait on a refresh or fail with an expired token
+class TokenRefresher(threading.Thread):
+	"""
+	Daemon thread that refreshes credentials `margin` seconds before they
+	expire and saves them to their token file.
+
+	Transport errors are retried with backoff. A RefreshError (e.g. a revoked
+	refresh token) stops the thread; the next API call then reports it.
+	Time is read and waited on through `clock` (a SystemClock by default).
+	"""
+
+	def __init__(self, creds, token_path, margin=REFRESH_MARGIN, clock=None):
+		super().__init__(name=f'token-refresh-{os.path.basename(token_path)}', daemon=True)
+		self.creds = creds
+		self.token_path = token_path
+		self.margin = margin
+		self.clock = clock or SystemClock()
+		self._stopped = threading.Event()
+
+	def seconds_left(self):
+		if self.creds.expiry is None:
+			return None
+		return (self.creds.expiry - self.clock.now()).total_seconds()
+
+	def run(self):
+		from google.auth.exceptions import RefreshError
+
+		failures = 0
+		refreshed = False
+		while not self._stopped.is_set():
+			left = self.seconds_left()
+			if left is None:
+				return
+			# Tokens shorter-lived than the margin are refreshed every 30s, not in a loop.
+			if self.clock.wait(self._stopped, max(30.0 if refreshed else 0.0, left - self.margin)):
+				return
+			try:
+				self.creds.refresh(auth_request())
+				save_token(self.token_path, self.creds)
+				failures = 0
+				refreshed = True
+			except RefreshError:
+				return
+			except Exception:
+				failures += 1
+				if self.clock.wait(self._stopped, min(60, 2 ** failures)):
+					return
+
+	def stop(self):
+		self._stopped.set()
@@ -0,0 +1,315 @@
+import re
+import json
+import sqlite3
+import threading
+from typing import Iterable, List, Optional
+from googleapiclient.errors import HttpError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT UNIQUE NOT NULL,
+    internal_date INTEGER NOT NULL DEFAULT 0,
+    subject TEXT,
+    sender TEXT,
+    recipients TEXT,
+    snippet TEXT,
+    resource TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_date ON messages(internal_date DESC);
+CREATE TABLE IF NOT EXISTS labels (
+    label TEXT NOT NULL,
+    msg_id TEXT NOT NULL,
+    PRIMARY KEY (label, msg_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS labels_msg ON labels(msg_id);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    subject, sender, recipients, snippet, content='messages', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, subject, sender, recipients, snippet)
+    VALUES (new.rowid, new.subject, new.sender, new.recipients, new.snippet);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, subject, sender, recipients, snippet)
+    VALUES ('delete', old.rowid, old.subject, old.sender, old.recipients, old.snippet);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF subject, sender, recipients, snippet ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, subject, sender, recipients, snippet)
+    VALUES ('delete', old.rowid, old.subject, old.sender, old.recipients, old.snippet);
+    INSERT INTO messages_fts(rowid, subject, sender, recipients, snippet)
+    VALUES (new.rowid, new.subject, new.sender, new.recipients, new.snippet);
+END;
+"""
+
+# Gmail search operators that map onto the local index; anything else
+# (free text, after:, has:, OR, negation, ...) is left to the API.
+FIELDS = {'from': 'sender', 'to': 'recipients', 'subject': 'subject'}
+IS_LABELS = {'starred': 'STARRED', 'unread': 'UNREAD', 'important': 'IMPORTANT'}
+# User labels are searched by name but stored by ID, so only system labels are local.
+SYSTEM_LABELS = {'INBOX', 'SENT', 'DRAFT', 'SPAM', 'TRASH', 'STARRED', 'UNREAD', 'IMPORTANT'}
+_TERM = re.compile(r'(?:(\w+):)?("[^"]*"|\([^()]*\)|\S+)')
+
+
+def _header(headers: list, name: str) -> str:
+    return next((header['value'] for header in headers if header['name'].lower() == name), '')
+
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.strip('"').replace('"', '""') + '"'
+
+
+def _field_values(value: str) -> Optional[List[str]]:
+    # 'subject:(a "b c")' matches messages whose subject has both a and "b c".
+    if not value.startswith('('):
+        return [value]
+    if not value.endswith(')'):
+        return None
+    values = []
+    for operator, word in _TERM.findall(value[1:-1]):
+        if operator or word.upper() in ('OR', 'AND') or word.startswith(('-', '{', '(')):
+            return None
+        values.append(word)
+    return values or None
+
+
+def parse_query(query: Optional[str]):
+    """
+    Translates a Gmail search query into an FTS5 expression and label filters.
+
+    Free-text terms are not translated: Gmail matches them against message
+    bodies too, which the index does not hold.
+
+    Args:
+        query (str): Gmail search query, e.g. 'from:alice subject:(q3 report) is:starred'.
+
+    Returns:
+        tuple: (FTS5 MATCH expression or None, list of label IDs), or None if
+        the query uses terms or operators the local index cannot answer.
+    """
+    terms, labels = [], []
+    for operator, value in _TERM.findall(query or ''):
+        operator = operator.lower()
+        if operator in FIELDS:
+            values = _field_values(value)
+            if values is None:
+                return None
+            terms += [f'{FIELDS[operator]} : {_fts_phrase(word)}' for word in values]
+        elif operator == 'is' and value.lower() in IS_LABELS:
+            labels.append(IS_LABELS[value.lower()])
+        elif operator in ('in', 'label') and value.upper() in SYSTEM_LABELS:
+            labels.append(value.upper())
+        else:
+            return None
+    return (' AND '.join(terms) or None), labels
+
+
+#local mirror of the mailbox metadata - answers searches without the API
+class MailIndex:
+    """
+    SQLite mirror of message metadata and snippets, with an FTS5 index over
+    subject, sender, recipients and snippet.
+
+    The first sync lists every message and stores its 'metadata' resource;
+    later syncs apply only the changes reported by users().history().list()
+    since the stored historyId, falling back to a full sync when Gmail no
+    longer has that history (HTTP 404).
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+#
+    @property
+    def history_id(self) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM state WHERE key = 'history_id'").fetchone()
+        return row[0] if row else None
+
+    def _set_history_id(self, history_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO state(key, value) VALUES ('history_id', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (str(history_id),)
+            )
+
+#
+    def upsert(self, resources: Iterable[dict]) -> int:
+        """
+        Stores Gmail message resources (format='metadata' or 'full').
+
+        Returns:
+            int: The number of messages stored.
+        """
+        count = 0
+        with self._lock, self._conn:
+            for message in resources:
+                headers = message.get('payload', {}).get('headers', [])
+                self._conn.execute(
+                    "INSERT INTO messages(id, internal_date, subject, sender, recipients, snippet, resource) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+                    "internal_date = excluded.internal_date, subject = excluded.subject, sender = excluded.sender, "
+                    "recipients = excluded.recipients, snippet = excluded.snippet, resource = excluded.resource",
+                    (
+                        message['id'], int(message.get('internalDate') or 0), _header(headers, 'subject'),
+                        _header(headers, 'from'), _header(headers, 'to'), message.get('snippet', ''),
+                        json.dumps(message, separators=(',', ':')),
+                    )
+                )
+                self._conn.execute("DELETE FROM labels WHERE msg_id = ?", (message['id'],))
+                self._conn.executemany(
+                    "INSERT INTO labels(label, msg_id) VALUES (?, ?)",
+                    [(label, message['id']) for label in message.get('labelIds', [])]
+                )
+                count += 1
+        return count
+
+    def delete(self, msg_ids: Iterable[str]) -> None:
+        msg_ids = [(msg_id,) for msg_id in msg_ids]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM messages WHERE id = ?", msg_ids)
+            self._conn.executemany("DELETE FROM labels WHERE msg_id = ?", msg_ids)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages")
+            self._conn.execute("DELETE FROM labels")
+            self._conn.execute("DELETE FROM state")
+
+#
+    def get(self, msg_id: str) -> Optional[dict]:
+        row = self._conn.execute("SELECT resource FROM messages WHERE id = ?", (msg_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        label: str = 'INBOX',
+        max_results: Optional[int] = 100,
+        offset: int = 0
+    ) -> Optional[List[dict]]:
+        """
+        Searches the local index, newest first, like users().messages().list().
+
+        Args:
+            query (str): Gmail search query; see parse_query for what is supported.
+            label (str): Label ID to filter on, or 'ALL' for everything but spam and trash.
+            max_results (int): Maximum number of messages to return.
+            offset (int): Number of matching messages to skip.
+
+        Returns:
+            list: Message resources, or None if the query must go to the API.
+        """
+        parsed = parse_query(query)
+        if parsed is None:
+            return None
+        match, labels = parsed
+        labels = labels + ([label] if label != 'ALL' else [])
+
+        sql = "SELECT m.resource FROM messages m WHERE 1"
+        params = []
+        if match:
+            sql += " AND m.rowid IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)"
+            params.append(match)
+        for label_id in labels:
+            sql += " AND EXISTS (SELECT 1 FROM labels l WHERE l.label = ? AND l.msg_id = m.id)"
+            params.append(label_id)
+        if not {'SPAM', 'TRASH'} & set(labels):
+            sql += " AND NOT EXISTS (SELECT 1 FROM labels l WHERE l.label IN ('SPAM', 'TRASH') AND l.msg_id = m.id)"
+        sql += " ORDER BY m.internal_date DESC, m.id DESC LIMIT ? OFFSET ?"
+        params += [max_results if max_results else -1, offset]
+        return [json.loads(row[0]) for row in self._conn.execute(sql, params)]
+
+#
+    def sync(self, tool, full: bool = True) -> Optional[dict]:
+        """
+        Brings the index up to date through the given GmailTool.
+
+        Args:
+            tool (GmailTool): Makes the API calls.
+            full (bool): Run a full sync when one is needed (nothing synced yet,
+                or the stored history expired). If False the index is left
+                empty instead, for the caller to run full_sync elsewhere.
+
+        Returns:
+            dict: Counts of 'updated' and 'deleted' messages, and whether a 'full'
+            sync ran; None if a full sync was needed but not run.
+        """
+        start = self.history_id
+        if start is None:
+            return self.full_sync(tool) if full else None
+
+        changed, deleted = set(), set()
+        latest = start
+        page_token = None
+        try:
+            while True:
+                result = tool.service.users().history().list(
+                    userId='me',
+                    startHistoryId=start,
+                    pageToken=page_token,
+                    maxResults=500
+                ).execute(http=tool._thread_http())
+                for record in result.get('history', []):
+                    for item in record.get('messagesAdded', []) + record.get('labelsAdded', []) \
+                            + record.get('labelsRemoved', []):
+                        changed.add(item['message']['id'])
+                    for item in record.get('messagesDeleted', []):
+                        deleted.add(item['message']['id'])
+                latest = result.get('historyId', latest)
+                page_token = result.get('nextPageToken')
+                if not page_token:
+                    break
+        except HttpError as e:
+            if getattr(e.resp, 'status', None) == 404:
+                # The stored historyId is too old for Gmail to replay.
+                if full:
+                    return self.full_sync(tool)
+                self.clear()
+                return None
+            raise
+
+        changed -= deleted
+        # Changed messages are re-read rather than patched, so their labels
+        # end up exactly as Gmail has them now.
+        fetched = tool.fetch_messages_metadata(sorted(changed)) if changed else {}
+        self.upsert(fetched.values())
+        self.delete(deleted | (changed - fetched.keys()))
+        self._set_history_id(latest)
+        return {'updated': len(fetched), 'deleted': len(deleted | (changed - fetched.keys())), 'full': False}
+
+    def full_sync(self, tool) -> dict:
+        """
+        Rebuilds the index from a full listing of the mailbox. Safe to run in
+        a background thread: API calls use that thread's own HTTP transport.
+        """
+        # Taken before listing, so changes made during the sync are replayed next time.
+        http = tool._thread_http()
+        history_id = tool.service.users().getProfile(userId='me').execute(http=http)['historyId']
+        self.clear()
+        updated = 0
+        page_token = None
+        while True:
+            result = tool.service.users().messages().list(
+                userId='me',
+                maxResults=500,
+                pageToken=page_token,
+                includeSpamTrash=True
+            ).execute(http=http)
+            msg_ids = [message['id'] for message in result.get('messages', [])]
+            if msg_ids:
+                updated += self.upsert(tool.fetch_messages_metadata(msg_ids).values())
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+        self._set_history_id(history_id)
+        return {'updated': updated, 'deleted': 0, 'full': True}
+
+    def close(self) -> None:
+        self._conn.close()
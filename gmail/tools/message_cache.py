@@ -0,0 +1,88 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+#keeps recently fetched 'full' messages - details and body share one download
+class MessageCache:
+    """
+    Bounded LRU cache of 'full' Gmail message resources.
+
+    Entries are keyed by message ID and remember the message's historyId;
+    a lookup or observe() that names a different historyId (the labels
+    changed) drops the stale entry. The payload is kept as Gmail sent it,
+    with bodies still base64 encoded, so nothing is decoded until a body is
+    asked for.
+    The JSON size of the cached resources is capped at `max_bytes` in total.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # msg_id -> (history_id, message, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+#
+    def get(self, msg_id: str, history_id: Optional[str] = None) -> Optional[dict]:
+        """
+        Args:
+            msg_id (str): The ID of the email message.
+            history_id (str): The message's current historyId, if known; None accepts any.
+
+        Returns:
+            dict: The cached message resource, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(msg_id)
+            if entry is not None and history_id is not None and entry[0] != str(history_id):
+                self._pop(msg_id)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(msg_id)
+            self.hits += 1
+            return entry[1]
+
+    def __contains__(self, msg_id: str) -> bool:
+        with self._lock:
+            return msg_id in self._entries
+
+    def put(self, message: dict) -> None:
+        size = len(json.dumps(message, separators=(',', ':')))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(message['id'])
+            self._entries[message['id']] = (str(message.get('historyId')), message, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def observe(self, msg_id: str, history_id: Optional[str]) -> None:
+        """
+        Drops the entry if `history_id` shows the message changed since it was cached.
+        """
+        if history_id is None:
+            return
+        with self._lock:
+            entry = self._entries.get(msg_id)
+            if entry is not None and entry[0] != str(history_id):
+                self._pop(msg_id)
+
+    def invalidate(self, msg_id: str) -> None:
+        with self._lock:
+            self._pop(msg_id)
+
+    def _pop(self, msg_id: str) -> None:
+        entry = self._entries.pop(msg_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+#
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,236 @@
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+
+from db import get_connection, quote
+from resultcache import normalize_sql, referenced_tables, is_read_only
+from sqlguard import time_budget
+
+logger = logging.getLogger(__name__)
+
+INDEX_PREFIX = "ix_adv_"
+MAX_LOG = 1000
+MEASURE_QUERIES = 5
+MEASURE_BUDGET = 5.0    # seconds per timed query run
+_DRAIN_BATCH = 10_000
+
+# Clauses whose columns benefit from an index, and what ends each of them.
+_CLAUSE = re.compile(
+    r"\b(WHERE|ON|ORDER\s+BY|GROUP\s+BY)\b(.*?)(?=\bWHERE\b|\bJOIN\b|\bON\b|\bGROUP\s+BY\b|\bORDER\s+BY\b"
+    r"|\bHAVING\b|\bLIMIT\b|\bUNION\b|\)|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+_IDENTIFIER = re.compile(r'"((?:[^"]|"")+)"|\b([A-Za-z_][A-Za-z0-9_]*)\b')
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\S+)")
+
+def index_name(table, column):
+    return INDEX_PREFIX + re.sub(r"\W+", "_", f"{table}_{column}")
+
+@dataclass
+class Candidate:
+    table: str
+    column: str
+    uses: int
+    estimated_speedup: float
+    measured_speedup: float | None = None
+
+    @property
+    def index(self):
+        return index_name(self.table, self.column)
+
+class IndexAdvisor:
+    """Suggests (and optionally creates) single-column indexes from the query workload.
+
+    Every executed read query is recorded with its EXPLAIN QUERY PLAN and run
+    time. Columns used in WHERE/JOIN ON/ORDER BY/GROUP BY on tables the plan
+    scans in full become candidates once they were used `min_uses` times. With
+    `auto_apply`, candidates are created every `auto_every` recorded queries by
+    a background thread, so the query that triggers it does not wait.
+    """
+
+    def __init__(self, db_path, catalog, min_uses=3, auto_apply=False, auto_every=50):
+        self.db_path = db_path
+        self.catalog = catalog
+        self.min_uses = min_uses
+        self.auto_apply = auto_apply
+        self.auto_every = auto_every
+        self._log = deque(maxlen=MAX_LOG)
+        self._plans = {}
+        self._recorded = 0
+        self._created = {}
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()
+        self._due = threading.Event()
+        if auto_apply:
+            threading.Thread(target=self._auto_apply, name="nl2sql-index-advisor", daemon=True).start()
+
+    def _plan(self, sql):
+        key = normalize_sql(sql)
+        plan = self._plans.get(key)
+        if plan is None:
+            rows = get_connection(self.db_path).execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+            plan = [row[-1] for row in rows]
+            if len(self._plans) >= MAX_LOG:
+                self._plans.clear()
+            self._plans[key] = plan
+        return plan
+
+    def _columns(self, sql, tables):
+        infos = [info for info in (self.catalog.get(t) for t in tables) if info is not None]
+        used = set()
+        for _, clause in _CLAUSE.findall(sql):
+            for quoted, bare in _IDENTIFIER.findall(clause):
+                name = quoted.replace('""', '"') if quoted else bare
+                for info in infos:
+                    if info.column(name) is not None:
+                        used.add((info.name, name))
+        return used
+
+    def record(self, sql, elapsed):
+        if not is_read_only(sql):
+            return
+        try:
+            plan = self._plan(sql)
+        except Exception:
+            return
+        tables = referenced_tables(sql, self.catalog.tables())
+        scanned = {m.group(1).strip('"') for m in map(_SCAN.match, plan) if m}
+        if scanned - set(tables):
+            # Scans reported under an alias: assume any referenced table may be scanned.
+            scanned |= set(tables)
+        entry = {
+            "at": time.time(),
+            "sql": sql,
+            "elapsed": elapsed,
+            "plan": plan,
+            "columns": {tc for tc in self._columns(sql, tables) if tc[0] in scanned},
+        }
+        with self._lock:
+            self._log.append(entry)
+            self._recorded += 1
+            due = self.auto_apply and self._recorded % self.auto_every == 0
+        if due:
+            self._due.set()
+
+    def _auto_apply(self):
+        while True:
+            self._due.wait()
+            self._due.clear()
+            try:
+                self.apply(self.candidates())
+            except Exception:
+                logger.exception("automatic index creation failed")
+
+    def _estimate(self, table, column):
+        # Full scan of N rows vs. a B-tree probe plus the matching rows.
+        info = self.catalog.get(table)
+        if info is None or not info.row_count:
+            return 1.0
+        n = info.row_count
+        col = info.column(column)
+        matching = n / col.distinct if col is not None and col.distinct else n
+        return round(n / (math.log2(n + 1) + matching), 1)
+
+    def candidates(self):
+        with self._lock:
+            uses = Counter(tc for entry in self._log for tc in entry["columns"])
+        existing = self._existing_indexes()
+        return sorted(
+            (
+                Candidate(table, column, count, self._estimate(table, column))
+                for (table, column), count in uses.items()
+                if count >= self.min_uses and (table, column) not in existing
+            ),
+            key=lambda c: (c.uses * c.estimated_speedup, c.uses),
+            reverse=True,
+        )
+
+    def _existing_indexes(self):
+        # (table, leading column) of every index, ours or not.
+        conn = get_connection(self.db_path)
+        found = set()
+        for table in self.catalog.tables():
+            for row in conn.execute(f"PRAGMA index_list({quote(table)})").fetchall():
+                info = conn.execute(f"PRAGMA index_info({quote(row[1])})").fetchall()
+                if info:
+                    found.add((table, info[0][2]))
+        return found
+
+    def _time_queries(self, queries):
+        # Rows are drained without being kept, and each run is cut off after
+        # MEASURE_BUDGET seconds (counted as taking exactly that long).
+        conn = get_connection(self.db_path)
+        total = 0.0
+        for sql in queries:
+            start = time.perf_counter()
+            try:
+                with time_budget(conn, MEASURE_BUDGET):
+                    cursor = conn.execute(sql)
+                    while cursor.fetchmany(_DRAIN_BATCH):
+                        pass
+            except TimeoutError:
+                total += MEASURE_BUDGET
+                continue
+            total += time.perf_counter() - start
+        return total
+
+    def apply(self, candidates):
+        """Create the given indexes, measuring the recorded queries that use each one."""
+        with self._apply_lock:
+            return self._apply(candidates)
+
+    def _apply(self, candidates):
+        conn = get_connection(self.db_path)
+        for candidate in candidates:
+            with self._lock:
+                queries = list(dict.fromkeys(
+                    entry["sql"] for entry in self._log if (candidate.table, candidate.column) in entry["columns"]
+                ))[-MEASURE_QUERIES:]
+            before = self._time_queries(queries)
+            self._created[candidate.index] = time.time()
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {quote(candidate.index)} "
+                f"ON {quote(candidate.table)} ({quote(candidate.column)})"
+            )
+            self._plans.clear()
+            after = self._time_queries(queries)
+            candidate.measured_speedup = round(before / after, 1) if after > 0 else None
+            with self._lock:
+                for entry in self._log:
+                    entry["columns"].discard((candidate.table, candidate.column))
+        if candidates:
+            self.catalog.invalidate()
+        return candidates
+
+    def unused_indexes(self):
+        # Advisor-created indexes that no recorded plan uses any more.
+        conn = get_connection(self.db_path)
+        ours = [
+            (row[0], row[1]) for row in conn.execute(
+                "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND name LIKE ?",
+                (INDEX_PREFIX + "%",),
+            ).fetchall()
+        ]
+        with self._lock:
+            log = list(self._log)
+        unused = []
+        for name, table in ours:
+            since = self._created.get(name, 0)
+            entries = [entry for entry in log if entry["at"] >= since and table in " ".join(entry["plan"])]
+            # Only judge indexes that the workload since their creation had a chance to use.
+            if entries and not any(name in detail for entry in entries for detail in entry["plan"]):
+                unused.append((name, table))
+        return unused
+
+    def drop(self, names):
+        conn = get_connection(self.db_path)
+        for name in names:
+            conn.execute(f"DROP INDEX IF EXISTS {quote(name)}")
+        if names:
+            self._plans.clear()
+            self.catalog.invalidate()
+        return names
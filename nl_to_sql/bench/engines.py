@@ -0,0 +1,135 @@
+"""Compare the SQLite and DuckDB query engines on the bundled datasets.
+
+    python bench/engines.py [--scale 10] [--repeat 20] [--json out.json]
+
+Every non-empty CSV in data/ is ingested into a scratch SQLite database and
+mirrored into DuckDB (imported, and as CSV views); each query then runs
+`--repeat` times per engine. `--scale N` stacks N copies of every file, with
+country codes suffixed so joins stay one-to-one, to see how the engines grow.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import pandas as pd
+
+from db import close_all
+from engine import SQLiteEngine, DuckDBEngine
+from sql import csv_to_sqlite
+
+DATA_DIR = os.path.join(os.path.dirname(HERE), "data")
+
+QUERIES = {
+    "long_sum_by_year": 'SELECT year, SUM(value) AS total FROM gdp_long GROUP BY year ORDER BY year',
+    "long_range_filter": 'SELECT code, AVG(value) FROM gdp_ppp_long WHERE year BETWEEN 1990 AND 2010 GROUP BY code ORDER BY 2 DESC LIMIT 20',
+    "wide_scan_avg": 'SELECT AVG("2000"), AVG("2010"), AVG("2020"), MAX("2020") - MIN("2020") FROM gdp',
+    "long_join": (
+        'SELECT g.year, SUM(g.value) / SUM(p.value) AS ratio FROM gdp_long g '
+        'JOIN gdp_ppp_long p ON p.code = g.code AND p.year = g.year GROUP BY g.year ORDER BY g.year'
+    ),
+    "top_per_year": (
+        'SELECT year, code, value FROM (SELECT year, code, value, '
+        'ROW_NUMBER() OVER (PARTITION BY year ORDER BY value DESC) AS rank FROM gdp_long) '
+        'WHERE rank <= 3 ORDER BY year, rank'
+    ),
+    "world_filter_sort": 'SELECT Country, Life_expectancy FROM world_data_2023 WHERE Life_expectancy > 70 ORDER BY Life_expectancy DESC',
+}
+
+def scaled_copy(csv_path, scale, out_dir):
+    # Written under the table name the server would give it (no hyphens).
+    df = pd.read_csv(csv_path, dtype=str)
+    code = next((c for c in df.columns if c.lower() in ("code", "country code", "abbreviation")), None)
+    copies = []
+    for i in range(scale):
+        copy = df.copy()
+        if code:
+            copy[code] = copy[code].fillna("") + (f"_{i}" if i else "")
+        copies.append(copy)
+    path = os.path.join(out_dir, os.path.basename(csv_path).replace("-", "_"))
+    pd.concat(copies, ignore_index=True).to_csv(path, index=False)
+    return path
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def run(args, work):
+    db_path = os.path.join(work, "bench.db")
+    csvs = [p for p in sorted(glob.glob(os.path.join(DATA_DIR, "*.csv"))) if os.path.getsize(p)]
+    csvs = [scaled_copy(p, args.scale, work) for p in csvs]
+
+    engines = {"sqlite": SQLiteEngine(db_path)}
+    try:
+        engines["duckdb"] = DuckDBEngine(db_path, os.path.join(work, "import.duckdb"), "import", args.threads)
+        engines["duckdb-csv"] = DuckDBEngine(db_path, os.path.join(work, "csv.duckdb"), "csv", args.threads)
+    except RuntimeError:
+        print("duckdb is not installed; benchmarking SQLite only.")
+
+    try:
+        ingest = {name: 0.0 for name in engines}
+        for path in csvs:
+            start = time.perf_counter()
+            table = csv_to_sqlite(path, db_path, progress=None)
+            ingest["sqlite"] += time.perf_counter() - start
+            for name, engine in engines.items():
+                if name != "sqlite":
+                    ingest[name] += timed(engine.sync, table, path)
+
+        results = {"scale": args.scale, "repeat": args.repeat, "ingest_s": ingest, "queries": {}}
+        header = f"{'query':<20}" + "".join(f"{name + ' p50/p95 ms':>26}" for name in engines)
+        print(f"\nscale {args.scale}x, {args.repeat} runs per query\n")
+        print(header)
+        print("-" * len(header))
+        for label, sql in QUERIES.items():
+            row, cells = {}, []
+            for name, engine in engines.items():
+                try:
+                    engine.execute(sql, 100_000)  # warm-up
+                    runs = [timed(engine.execute, sql, 100_000) * 1000 for _ in range(args.repeat)]
+                except Exception as e:
+                    row[name] = {"error": str(e)}
+                    cells.append(f"{'error':>26}")
+                    continue
+                row[name] = {"p50_ms": statistics.median(runs), "p95_ms": percentile(runs, 95)}
+                cells.append(f"{row[name]['p50_ms']:>17.2f} / {row[name]['p95_ms']:<6.2f}")
+            results["queries"][label] = row
+            print(f"{label:<20}" + "".join(cells))
+        print("\nload (s, DuckDB is the extra mirroring time): " + ", ".join(f"{name} {secs:.2f}" for name, secs in ingest.items()))
+        return results
+    finally:
+        for engine in engines.values():
+            engine.close()
+        close_all()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # Scaled copies and databases can run to hundreds of MB; they go with the run.
+    with tempfile.TemporaryDirectory(prefix="nl2sql-bench-") as work:
+        results = run(args, work)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Deterministic stand-in for the Anthropic client used by the benchmarks.
+
+Maps the user question embedded in the nl_to_sql prompt to canned SQL, so
+runs are repeatable and never touch the network.
+"""
+import asyncio
+import re
+from types import SimpleNamespace
+
+QUESTIONS = {
+    "total gdp by year": 'SELECT year, SUM(value) AS total FROM gdp_long GROUP BY year ORDER BY year',
+    "top economies in 2020": 'SELECT "Country_Name", "2020" FROM gdp ORDER BY "2020" DESC LIMIT 10',
+    "average gdp per country since 2000": (
+        'SELECT code, AVG(value) AS avg_gdp FROM gdp_long WHERE year >= 2000 GROUP BY code ORDER BY avg_gdp DESC'
+    ),
+    "gdp to ppp ratio by year": (
+        'SELECT g.year, SUM(g.value) / SUM(p.value) AS ratio FROM gdp_long g '
+        'JOIN gdp_ppp_long p ON p.code = g.code AND p.year = g.year GROUP BY g.year ORDER BY g.year'
+    ),
+    "countries by life expectancy": (
+        'SELECT "Country", "Life_expectancy" FROM world_data_2023 ORDER BY "Life_expectancy" DESC'
+    ),
+    "every yearly gdp value": 'SELECT country, code, year, value FROM gdp_long',
+}
+
+_QUESTION = re.compile(r'"""(.*?)"""', re.DOTALL)
+
+class FakeAnthropic:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.messages = SimpleNamespace(create=self.create)
+
+    async def create(self, messages, **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        match = _QUESTION.search(messages[-1]["content"])
+        question = match.group(1).strip() if match else ""
+        sql = QUESTIONS.get(question, "SELECT 1")
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=f"```sql\n{sql}\n```")])
@@ -0,0 +1,19 @@
+"""The nl_to_sql MCP server over stdio, with the fake LLM and no browser.
+
+Run from the directory holding the data/ folder to benchmark against.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import main
+from fake_llm import FakeAnthropic
+
+main.claude = FakeAnthropic(latency=float(os.getenv("FAKE_LLM_LATENCY") or 0))
+main.webbrowser.open = lambda url: None
+
+if __name__ == "__main__":
+    main.mcp.run()
@@ -0,0 +1,282 @@
+"""Benchmark and load test for the nl_to_sql MCP server.
+
+    python bench/harness.py [--mode inproc|stdio|both] [--scales 1,10,100]
+                            [--clients 1,8] [--iterations 5] [--warm]
+                            [--save NAME] [--compare NAME] [--tolerance 0.25]
+
+Each (mode, scale) pair runs in a fresh worker process against scaled copies
+of the bundled CSVs, with the fake LLM from fake_llm.py. "inproc" calls the
+tools and their stages directly; "stdio" starts bench/fake_server.py and
+talks MCP to it. Per-stage latency percentiles, nl_to_sql throughput under
+N concurrent clients and peak RSS are reported. Result caching is disabled
+unless --warm is given.
+
+--save stores the run under bench/baselines/NAME.json. --compare reports
+changes against a saved run and exits non-zero on regressions beyond
+--tolerance.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from engines import percentile, scaled_copy
+from fake_llm import QUESTIONS
+
+BASELINE_DIR = os.path.join(HERE, "baselines")
+FAKE_SERVER = os.path.join(HERE, "fake_server.py")
+PLOTS = [
+    ("total gdp by year", "year", "total", "line"),
+    ("top economies in 2020", "Country_Name", "2020", "bar"),
+    ("every yearly gdp value", "year", "value", "scatter"),
+]
+# The query whose result spans several pages, for fetch_page.
+PAGED_QUESTION = "every yearly gdp value"
+
+class Timings:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    async def measure(self, stage, awaitable):
+        start = time.perf_counter()
+        result = await awaitable
+        self.samples[stage].append((time.perf_counter() - start) * 1000)
+        return result
+
+    def summary(self):
+        return {
+            stage: {
+                "n": len(ms),
+                "p50_ms": percentile(ms, 50),
+                "p95_ms": percentile(ms, 95),
+                "p99_ms": percentile(ms, 99),
+            }
+            for stage, ms in self.samples.items()
+        }
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def prepare(work, scale):
+    data = os.path.join(work, "data")
+    os.makedirs(data)
+    for path in sorted(glob.glob(os.path.join(ROOT, "data", "*.csv"))):
+        if os.path.getsize(path):
+            scaled_copy(path, scale, data)
+    return sorted(glob.glob(os.path.join(data, "*.csv")))
+
+async def load_test(call, clients, iterations, timings):
+    # `clients` concurrent callers, each asking every canned question `iterations` times.
+    questions = list(QUESTIONS)
+
+    async def client(offset):
+        for i in range(iterations * len(questions)):
+            await timings.measure(f"load_{clients}", call(questions[(offset + i) % len(questions)]))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    return clients * iterations * len(questions) / (time.perf_counter() - start)
+
+async def run_inproc(args, work, csvs):
+    os.chdir(work)
+    from fake_llm import FakeAnthropic
+    import main
+
+    main.claude = FakeAnthropic()
+    main.webbrowser.open = lambda url: None
+    main.init_state()
+    timings = Timings()
+    session = main.sessions.get()
+
+    for path in csvs:
+        await timings.measure("ingest", main.upload_csv(path))
+    tables = main.catalog.tables()
+
+    results = {}
+    for _ in range(args.iterations):
+        for table in tables:
+            await timings.measure("schema", main.run_blocking(main.get_table_schema, table))
+        for question, sql in QUESTIONS.items():
+            await timings.measure("context", main.run_blocking(main.build_context, question, session.tables))
+            sql = await timings.measure("validate", main.run_db(main.engine, main.guard_sql, sql))
+            df = await timings.measure("sql", main.run_db(main.engine, main.run_query, sql))
+            result = main.sessions.add_result(session, sql, df)
+            results[question] = (result, df)
+            await timings.measure("format", main.run_blocking(main.load_page, result, 0))
+        paged = results[PAGED_QUESTION][0]
+        await timings.measure("fetch_page", main.run_db(main.engine, main.load_page, paged, paged.total_rows // 2))
+        for question, x, y, kind in PLOTS:
+            df = results[question][1]
+            path = os.path.join("data", "bench_plot.html")
+            await timings.measure(f"plot_{kind}", main.run_blocking(main.write_plot, df, x, y, kind, path))
+        for question in QUESTIONS:
+            await timings.measure("nl_to_sql", main.nl_to_sql(question))
+
+    throughput = {}
+    for clients in args.clients:
+        throughput[str(clients)] = await load_test(main.nl_to_sql, clients, args.iterations, timings)
+    return {"stages": timings.summary(), "throughput_rps": throughput, "peak_rss_mb": peak_rss_mb()}
+
+def tool_text(result):
+    return "".join(getattr(block, "text", "") for block in result.content)
+
+async def run_stdio(args, work, csvs):
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    params = StdioServerParameters(command=sys.executable, args=[FAKE_SERVER], cwd=work, env=dict(os.environ))
+    timings = Timings()
+    with open(os.devnull, "w") as devnull:
+        async with stdio_client(params, errlog=devnull) as (read, write):
+            async with ClientSession(read, write) as session:
+                start = time.perf_counter()
+                await session.initialize()
+                timings.samples["startup"].append((time.perf_counter() - start) * 1000)
+
+                for path in csvs:
+                    await timings.measure("ingest", session.call_tool("upload_csv", {"file_path": path}))
+                for _ in range(args.iterations):
+                    token = None
+                    for question, sql in QUESTIONS.items():
+                        text = tool_text(await timings.measure("sql", session.call_tool("run_sql_manual", {"sql": sql})))
+                        if question == PAGED_QUESTION and 'fetch_page("' in text:
+                            token = text.split('fetch_page("')[1].split('"')[0]
+                    if token:
+                        await timings.measure("fetch_page", session.call_tool("fetch_page", {"page_token": token}))
+                    for question, x, y, kind in PLOTS:
+                        await session.call_tool("nl_to_sql", {"query": question})
+                        await timings.measure(
+                            f"plot_{kind}", session.call_tool("show_plot", {"x_column": x, "y_column": y, "kind": kind})
+                        )
+                    for question in QUESTIONS:
+                        await timings.measure("nl_to_sql", session.call_tool("nl_to_sql", {"query": question}))
+
+                throughput = {}
+                for clients in args.clients:
+                    call = lambda question: session.call_tool("nl_to_sql", {"query": question})
+                    throughput[str(clients)] = await load_test(call, clients, args.iterations, timings)
+    # The server has exited, so its peak RSS is now accounted to this process.
+    return {"stages": timings.summary(), "throughput_rps": throughput, "peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN)}
+
+def worker(args):
+    if not args.warm:
+        os.environ.update(RESULT_CACHE_BYTES="1", RESULT_CACHE_SPILL="0")
+    run = run_inproc if args.worker == "inproc" else run_stdio
+    # At 100x the scaled CSVs and databases take hundreds of MB; they go with the run.
+    with tempfile.TemporaryDirectory(prefix=f"nl2sql-load-{args.scale}x-") as work:
+        csvs = prepare(work, args.scale)
+        os.environ.update(SQLITE_DB=os.path.join(work, "sqlite.db"))
+        try:
+            result = asyncio.run(run(args, work, csvs))
+            result["rows"] = sum(sum(1 for _ in open(p, encoding="utf-8", errors="ignore")) - 1 for p in csvs)
+        finally:
+            os.chdir(HERE)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+def spawn(args, mode, scale):
+    fd, output = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--worker", mode, "--scale", str(scale),
+        "--iterations", str(args.iterations), "--clients", ",".join(map(str, args.clients)), "--output", output,
+    ] + (["--warm"] if args.warm else [])
+    try:
+        subprocess.run(cmd, check=True, stderr=None if args.verbose else subprocess.DEVNULL)
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(output)
+
+def report(run):
+    for key, result in run["results"].items():
+        print(f"\n== {key}: {result['rows']:,} CSV rows, peak RSS {result['peak_rss_mb']:.0f} MB")
+        print(f"{'stage':<14}{'n':>6}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+        for stage, s in result["stages"].items():
+            print(f"{stage:<14}{s['n']:>6}{s['p50_ms']:>12.2f}{s['p95_ms']:>12.2f}{s['p99_ms']:>12.2f}")
+        print("nl_to_sql throughput: " + ", ".join(
+            f"{clients} client{'s' if clients != '1' else ''} {rps:.1f} req/s" for clients, rps in result["throughput_rps"].items()
+        ))
+
+def compare(run, baseline, tolerance, min_delta_ms=1.0):
+    """Print changes against `baseline`; return the number of regressions."""
+    regressions = 0
+    print(f"\n== compared with baseline (tolerance {tolerance:.0%})")
+    for key, result in run["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            print(f"{key}: not in baseline")
+            continue
+        metrics = [(f"{stage} p95", s["p95_ms"], base["stages"][stage]["p95_ms"], False)
+                   for stage, s in result["stages"].items() if stage in base["stages"]]
+        metrics += [(f"throughput x{c}", rps, base["throughput_rps"][c], True)
+                    for c, rps in result["throughput_rps"].items() if c in base["throughput_rps"]]
+        metrics.append(("peak RSS MB", result["peak_rss_mb"], base["peak_rss_mb"], False))
+        for name, now, then, higher_is_better in metrics:
+            change = (now - then) / then if then else 0.0
+            worse = -change if higher_is_better else change
+            # Sub-millisecond latencies are mostly noise.
+            noise = name.endswith(" p95") and abs(now - then) < min_delta_ms
+            flag = "REGRESSION" if worse > tolerance and not noise else ""
+            regressions += bool(flag)
+            print(f"{key:<14}{name:<22}{then:>12.2f}{now:>12.2f}{change:>+9.0%}  {flag}")
+    return regressions
+
+def parse_ints(text):
+    return [int(v) for v in text.split(",") if v]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("inproc", "stdio", "both"), default="inproc")
+    parser.add_argument("--scales", type=parse_ints, default=[1, 10, 100])
+    parser.add_argument("--clients", type=parse_ints, default=[1, 8])
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--warm", action="store_true", help="keep the result cache enabled")
+    parser.add_argument("--save", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore latency changes smaller than this")
+    parser.add_argument("--verbose", action="store_true", help="show worker and server logs")
+    parser.add_argument("--worker", choices=("inproc", "stdio"), help=argparse.SUPPRESS)
+    parser.add_argument("--scale", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    modes = ["inproc", "stdio"] if args.mode == "both" else [args.mode]
+    run = {"created": time.time(), "iterations": args.iterations, "warm": args.warm, "results": {}}
+    for mode in modes:
+        for scale in args.scales:
+            print(f"running {mode} at {scale}x ...", flush=True)
+            run["results"][f"{mode}/{scale}x"] = spawn(args, mode, scale)
+    report(run)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nsaved baseline {path}")
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json"), encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(run, baseline, args.tolerance, args.min_delta_ms):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Startup-time benchmark for the nl_to_sql and Gmail MCP servers.
+
+    python bench/startup.py [--servers nl_to_sql,gmail] [--repeat 5] [--top 10]
+                            [--save NAME] [--compare NAME] [--tolerance 0.25]
+
+For each server, every repeat runs in fresh processes:
+
+- "import": `python -X importtime -c "import <module>"`, i.e. the cost of
+  loading the server module and everything it pulls in;
+- "ready": start the server over stdio and time until it has answered
+  `initialize` and `tools/list`, which is what an MCP client waits for.
+
+The heaviest imports of the last run are listed, and any module that should
+only load on first use (the LLM SDK, plotly, duckdb, the Google client
+libraries) but was imported at startup is reported and fails the run. --save and --compare
+work as in harness.py, under bench/baselines/startup-NAME.json; a baseline keeps
+only the stage timings and the eagerly imported modules, not the import list.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from engines import percentile
+
+BASELINE_DIR = os.path.join(HERE, "baselines")
+SERVERS = {
+    "nl_to_sql": (ROOT, "main"),
+    "gmail": (os.path.join(os.path.dirname(ROOT), "gmail"), "mcp_gmail"),
+}
+# Modules that must not be imported until a tool needs them.
+DEFERRED = {
+    "nl_to_sql": ("anthropic", "plotly.express", "duckdb"),
+    "gmail": ("anthropic", "googleapiclient.discovery", "google_auth_oauthlib.flow"),
+}
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| *(\S+)$")
+
+def import_time(directory, module, work):
+    """Run one cold import; return (wall ms, {module: cumulative ms}) for every module loaded."""
+    code = f"import sys; sys.path.insert(0, {directory!r}); import {module}"
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=work, capture_output=True, text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+    )
+    wall = (time.perf_counter() - start) * 1000
+    if proc.returncode:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            cumulative[match.group(3)] = int(match.group(2)) / 1000
+    return wall, cumulative
+
+async def ready_time(directory, module, work):
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    params = StdioServerParameters(
+        command=sys.executable, args=[os.path.join(directory, f"{module}.py")], cwd=work, env=dict(os.environ),
+    )
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        async with stdio_client(params, errlog=devnull) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                await session.list_tools()
+                return (time.perf_counter() - start) * 1000
+
+def measure(name, repeat):
+    directory, module = SERVERS[name]
+    import_ms, wall_ms, ready_ms = [], [], []
+    cumulative = {}
+    for _ in range(repeat):
+        # A fresh working directory each time, so nl_to_sql starts without a database.
+        with tempfile.TemporaryDirectory(prefix=f"{name}-startup-") as work:
+            wall, cumulative = import_time(directory, module, work)
+            wall_ms.append(wall)
+            import_ms.append(cumulative.get(module, 0.0))
+        with tempfile.TemporaryDirectory(prefix=f"{name}-startup-") as work:
+            ready_ms.append(asyncio.run(ready_time(directory, module, work)))
+    return {
+        "stages": {
+            stage: {"n": len(ms), "p50_ms": percentile(ms, 50), "p95_ms": percentile(ms, 95)}
+            for stage, ms in (("import", import_ms), ("process", wall_ms), ("ready", ready_ms))
+        },
+        "imports": dict(sorted(cumulative.items(), key=lambda item: -item[1])),
+        "eager": [m for m in DEFERRED[name] if m in cumulative],
+    }
+
+def report(run, top):
+    for name, result in run["results"].items():
+        print(f"\n== {name}")
+        print(f"{'stage':<10}{'n':>4}{'p50 ms':>12}{'p95 ms':>12}")
+        for stage, s in result["stages"].items():
+            print(f"{stage:<10}{s['n']:>4}{s['p50_ms']:>12.1f}{s['p95_ms']:>12.1f}")
+        print("heaviest imports (cumulative ms, last run):")
+        module = SERVERS[name][1]
+        shown = [(m, ms) for m, ms in result["imports"].items() if m != module][:top]
+        for m, ms in shown:
+            print(f"  {m:<48}{ms:>10.1f}")
+        if result["eager"]:
+            print(f"imported at startup but should be deferred: {', '.join(result['eager'])}")
+
+def compare(run, baseline, tolerance):
+    """Print changes against `baseline`; return the number of regressions."""
+    regressions = 0
+    print(f"\n== compared with baseline (tolerance {tolerance:.0%})")
+    for name, result in run["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name}: not in baseline")
+            continue
+        for stage, s in result["stages"].items():
+            if stage not in base["stages"]:
+                continue
+            now, then = s["p50_ms"], base["stages"][stage]["p50_ms"]
+            change = (now - then) / then if then else 0.0
+            flag = "REGRESSION" if change > tolerance else ""
+            regressions += bool(flag)
+            print(f"{name:<12}{stage + ' p50':<14}{then:>10.1f}{now:>10.1f}{change:>+9.0%}  {flag}")
+    return regressions
+
+def baseline(run):
+    """The part of `run` that is saved: stage timings and the eager imports."""
+    results = {
+        name: {"stages": result["stages"], "eager": result["eager"]}
+        for name, result in run["results"].items()
+    }
+    return dict(run, results=results)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--servers", default=",".join(SERVERS), help="comma-separated: " + ", ".join(SERVERS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="number of heaviest imports to list")
+    parser.add_argument("--save", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    run = {"created": time.time(), "repeat": args.repeat, "results": {}}
+    for name in filter(None, args.servers.split(",")):
+        if name not in SERVERS:
+            parser.error(f"unknown server {name!r}")
+        print(f"measuring {name} ...", flush=True)
+        run["results"][name] = measure(name, args.repeat)
+    report(run, args.top)
+
+    failed = any(result["eager"] for result in run["results"].values())
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"startup-{args.save}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(baseline(run), f, indent=2)
+        print(f"\nsaved baseline {path}")
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"startup-{args.compare}.json"), encoding="utf-8") as f:
+            saved = json.load(f)
+        failed = compare(run, saved, args.tolerance) or failed
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+import hashlib
+import math
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+
+from db import quote
+from sql import LONG_SUFFIX, detect_year_layout
+
+STATS_SAMPLE_ROWS = 100_000
+STATS_BATCH_COLUMNS = 100
+SAMPLE_VALUES = 3
+SAMPLE_MAX_CHARS = 40
+KEY_DISTINCT_RATIO = 0.9
+KEY_SAMPLE_VALUES = 2000
+JOIN_OVERLAP = 0.5
+MAX_PROMPT_TABLES = 3
+MAX_PROMPT_COLUMNS = 40
+MAX_OMITTED_NAMES = 100
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "by", "did", "do", "does", "for", "from", "give", "has", "have",
+    "how", "in", "is", "list", "long", "many", "me", "much", "of", "on", "or", "show", "tell", "than", "that",
+    "the", "their", "there", "to", "was", "were", "what", "when", "where", "which", "who", "with",
+}
+
+def tokenize(text):
+    tokens = set()
+    for word in re.findall(r"[a-z]+|\d+", str(text).lower()):
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.isdigit():
+            word = word[:-1]
+        tokens.add(word)
+    return tokens
+
+@dataclass
+class ColumnInfo:
+    name: str
+    type: str
+    distinct: int | None = None
+    min: object = None
+    max: object = None
+    samples: list = field(default_factory=list)
+    key_values: frozenset = frozenset()
+
+    @property
+    def is_key(self):
+        return bool(self.key_values)
+
+@dataclass
+class TableInfo:
+    name: str
+    columns: list[ColumnInfo]
+    row_count: int
+    version: int = 0
+
+    def column(self, name):
+        return next((c for c in self.columns if c.name == name), None)
+
+    @property
+    def keys(self):
+        return [c for c in self.columns if c.is_key]
+
+class SchemaCatalog:
+    """In-memory cache of table schemas and cheap column statistics.
+
+    Entries are filled once (normally right after ingest) and served from memory
+    afterwards. External changes are picked up through SQLite's schema_version and
+    data_version, polled at most every `check_interval` seconds.
+    """
+
+    def __init__(self, db_path, check_interval=5.0):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self._tables = {}
+        self._column_names = {}
+        self._versions = {}
+        self._epoch = 0
+        self._table_names = None
+        self._lock = threading.RLock()
+        self._conn = None
+        self._db_versions = None
+        self._last_check = 0.0
+
+    def _connection(self):
+        # A dedicated connection: data_version is only meaningful when compared on
+        # the same connection, so this cannot share the per-thread pool.
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._conn
+
+    def _read_versions(self):
+        conn = self._connection()
+        self._last_check = time.monotonic()
+        return (
+            conn.execute("PRAGMA schema_version").fetchone()[0],
+            conn.execute("PRAGMA data_version").fetchone()[0],
+        )
+
+    def _check_versions(self):
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+        versions = self._read_versions()
+        if self._db_versions is not None and versions != self._db_versions:
+            # Written by someone else: we cannot tell which tables changed.
+            self._epoch += 1
+            self._table_names = None
+            self._column_names.clear()
+            for name in list(self._tables):
+                self._drop(name)
+        self._db_versions = versions
+
+    def _drop(self, table):
+        self._tables.pop(table, None)
+        self._column_names.pop(table, None)
+        self._versions[table] = self._versions.get(table, 0) + 1
+
+    def invalidate(self, table=None):
+        # Called by in-process ingest; the change it made is accounted for here, so
+        # the next version poll must not treat it as an external write.
+        with self._lock:
+            if not table:
+                self._column_names.clear()
+            for name in [table] if table else list(self._tables):
+                self._drop(name)
+            self._table_names = None
+            self._db_versions = self._read_versions()
+
+    def reload_table_names(self):
+        # After an in-process statement that may have created or dropped tables.
+        with self._lock:
+            self._table_names = None
+            self._db_versions = self._read_versions()
+
+    def refresh(self, table):
+        with self._lock:
+            self.invalidate(table)
+            return self.get(table)
+
+    def version(self, table):
+        # Opaque token that changes whenever the table's data may have changed.
+        with self._lock:
+            self._check_versions()
+            return (self._epoch, self._versions.get(table, 0))
+
+    def tables(self):
+        with self._lock:
+            self._check_versions()
+            if self._table_names is None:
+                rows = self._connection().execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+                ).fetchall()
+                self._table_names = [row[0] for row in rows]
+            return list(self._table_names)
+
+    def column_names(self, table):
+        # From the schema alone: no statistics are computed.
+        with self._lock:
+            self._check_versions()
+            info = self._tables.get(table)
+            if info is not None:
+                return [c.name for c in info.columns]
+            names = self._column_names.get(table)
+            if names is None:
+                names = self._column_names[table] = [
+                    row[1] for row in self._connection().execute(f"PRAGMA table_info({quote(table)})").fetchall()
+                ]
+            return names
+
+    def get(self, table):
+        with self._lock:
+            self._check_versions()
+            info = self._tables.get(table)
+            if info is None:
+                info = self._load(table)
+                if info is not None:
+                    self._tables[table] = info
+            return info
+
+    def _load(self, table):
+        conn = self._connection()
+        columns = [
+            ColumnInfo(name=row[1], type=row[2] or "TEXT")
+            for row in conn.execute(f"PRAGMA table_info({quote(table)})").fetchall()
+        ]
+        if not columns:
+            return None
+
+        row_count = conn.execute(f"SELECT COUNT(*) FROM {quote(table)}").fetchone()[0]
+        # Statistics are computed over a bounded prefix so huge tables stay cheap.
+        source = quote(table)
+        if row_count > STATS_SAMPLE_ROWS:
+            source = f"(SELECT * FROM {quote(table)} LIMIT {STATS_SAMPLE_ROWS})"
+
+        for i in range(0, len(columns), STATS_BATCH_COLUMNS):
+            batch = columns[i:i + STATS_BATCH_COLUMNS]
+            exprs = ", ".join(
+                f"COUNT(DISTINCT {quote(c.name)}), MIN({quote(c.name)}), MAX({quote(c.name)})" for c in batch
+            )
+            values = conn.execute(f"SELECT {exprs} FROM {source}").fetchone()
+            for j, col in enumerate(batch):
+                col.distinct, col.min, col.max = values[3 * j:3 * j + 3]
+
+        for col in columns:
+            if col.type.upper() == "TEXT":
+                col.samples = [
+                    str(row[0])[:SAMPLE_MAX_CHARS] for row in conn.execute(
+                        f"SELECT DISTINCT {quote(col.name)} FROM {source} "
+                        f"WHERE {quote(col.name)} IS NOT NULL LIMIT {SAMPLE_VALUES}"
+                    ).fetchall()
+                ]
+
+        # Near-unique text columns are join key candidates; keep a bounded set of
+        # their normalized values so overlaps between tables can be measured.
+        for col in columns:
+            if col.type.upper() == "TEXT" and row_count and (col.distinct or 0) >= KEY_DISTINCT_RATIO * min(row_count, STATS_SAMPLE_ROWS):
+                col.key_values = frozenset(
+                    str(row[0]).strip().lower() for row in conn.execute(
+                        f"SELECT DISTINCT {quote(col.name)} FROM {source} "
+                        f"WHERE {quote(col.name)} IS NOT NULL LIMIT {KEY_SAMPLE_VALUES}"
+                    ).fetchall()
+                )
+
+        return TableInfo(name=table, columns=columns, row_count=row_count, version=self._versions.get(table, 0))
+
+    def schema_hash(self, tables):
+        # Depends on names and types only, so reloading the same layout keeps
+        # anything keyed on it (e.g. the generated-SQL cache) valid.
+        if isinstance(tables, str):
+            tables = [tables]
+        parts = []
+        for table in sorted(tables):
+            info = self.get(table)
+            if info is None:
+                return None
+            parts += [info.name] + [f"{c.name}:{c.type}" for c in info.columns]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def join_keys(self, tables):
+        # Pairs of key columns whose value sets overlap, e.g. gdp."Country_Name"
+        # and world_data_2023."Country".
+        infos = [info for info in (self.get(t) for t in tables) if info is not None]
+        joins = []
+        for i, left in enumerate(infos):
+            for right in infos[i + 1:]:
+                for lcol in left.keys:
+                    for rcol in right.keys:
+                        overlap = len(lcol.key_values & rcol.key_values)
+                        if overlap >= JOIN_OVERLAP * min(len(lcol.key_values), len(rcol.key_values)):
+                            joins.append((left.name, lcol.name, right.name, rcol.name))
+        return joins
+
+    def select_tables(self, question, preferred=(), limit=MAX_PROMPT_TABLES):
+        """Rank tables by how well their names and column names cover the question.
+
+        Only the schema is read, so statistics are computed (by prompt_context)
+        for the selected tables alone. A long-format table counts as having the
+        year columns of its wide source. Question words are weighted by inverse
+        table frequency, so words that appear everywhere ("country", a year)
+        count less than distinctive ones. Tables scoring under half of the best
+        are dropped. `preferred` (most recent last) breaks ties and is the
+        fallback when nothing matches.
+        """
+        words = tokenize(question)
+        preferred = list(preferred)
+        columns = {table: self.column_names(table) for table in self.tables()}
+        vocab = {}
+        for table, names in columns.items():
+            if not names:
+                continue
+            if table.endswith(LONG_SUFFIX):
+                layout = detect_year_layout(columns.get(table[:-len(LONG_SUFFIX)], []))
+                names = names + (layout[2] if layout else [])
+            vocab[table] = (tokenize(table), set().union(*(tokenize(c) for c in names)))
+        if not vocab:
+            return []
+
+        def idf(word):
+            df = sum(1 for name, cols in vocab.values() if word in name | cols)
+            return math.log((len(vocab) + 1) / (df + 1)) + 1
+
+        weights = {word: idf(word) for word in words}
+        scored = []
+        for table, (name, cols) in vocab.items():
+            score = sum(
+                w * (3 * (word in name) / len(name) + (word in cols))
+                for word, w in weights.items()
+            )
+            if score:
+                bonus = (preferred.index(table) + 1) / (len(preferred) + 1) if table in preferred else 0
+                scored.append((score + bonus, table))
+        scored.sort(reverse=True)
+        selected = [table for score, table in scored[:limit] if score >= scored[0][0] / 2]
+        if not selected:
+            selected = [preferred[-1]] if preferred else list(vocab)[:limit]
+        return selected
+
+    def select_columns(self, table, question, limit=MAX_PROMPT_COLUMNS):
+        info = self.get(table)
+        if info is None:
+            return []
+        if len(info.columns) <= limit:
+            return info.columns
+        words = tokenize(question)
+        chosen = [c for c in info.columns if c.is_key]
+        chosen += [c for c in info.columns if c not in chosen and words & tokenize(c.name)]
+        # Fill up with populated columns; all-NULL ones carry no information.
+        chosen += [c for c in info.columns if c not in chosen and c.distinct][:max(0, limit - len(chosen))]
+        chosen = chosen[:limit]
+        return [c for c in info.columns if c in chosen]
+
+    def prompt_context(self, question, tables):
+        """Schema text for the prompt: only the selected tables and columns, plus join keys."""
+        sections = [self.describe(table, self.select_columns(table, question)) for table in tables]
+        joins = self.join_keys(tables)
+        if joins:
+            sections.append("Join keys:\n" + "\n".join(
+                f"{quote(lt)}.{quote(lc)} = {quote(rt)}.{quote(rc)}" for lt, lc, rt, rc in joins
+            ))
+        return "\n\n".join(section for section in sections if section)
+
+    def describe(self, table, columns=None):
+        info = self.get(table)
+        if info is None:
+            return ""
+        columns = info.columns if columns is None else columns
+        lines = [f'Table "{info.name}" ({info.row_count} rows):']
+        for col in columns:
+            line = f"{quote(col.name)} ({col.type})"
+            details = []
+            if col.distinct == 0:
+                details.append("all NULL")
+            elif col.distinct is not None:
+                details.append(f"{col.distinct} distinct")
+            if col.samples:
+                details.append("e.g. " + ", ".join(repr(v) for v in col.samples))
+            elif col.min is not None:
+                details.append(f"range {col.min} .. {col.max}")
+            if details:
+                line += " - " + "; ".join(details)
+            lines.append(line)
+        omitted = [c for c in info.columns if c not in columns]
+        if len(omitted) > MAX_OMITTED_NAMES:
+            lines.append(f"... {len(omitted)} more columns not shown")
+        elif omitted:
+            lines.append("Other columns (no statistics shown): " + ", ".join(quote(c.name) for c in omitted))
+        return "\n".join(lines)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,12 +1,11 @@
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import plotly.express as px
-import pandas as pd
 import os
-
-# Paths
-CSV_PATH = os.path.join("data", "last_result.csv")
+import feed
+from plotting import build_figure
 
 # Initialize Dash app
 app = dash.Dash(__name__)
@@ -28,48 +27,64 @@ app.layout = html.Div([
 
     dcc.Graph(id="main-graph"),
 
+    # Only the small manifest is checked on each tick; the result itself is
+    # re-read when its version changes.
     dcc.Interval(
         id='interval-update',
-        interval=3*1000,  # refresh every 3 sec
+        interval=1000,
         n_intervals=0
     ),
+    dcc.Store(id="rendered", data={"mtime": -1, "chart_type": None}),
 
     html.Div(id="status", style={"marginTop": "20px", "fontFamily": "monospace"})
 ])
 
+def manifest_mtime():
+    try:
+        return os.stat(feed.MANIFEST_PATH).st_mtime_ns
+    except OSError:
+        return None
+
 @app.callback(
     [Output("main-graph", "figure"),
-     Output("status", "children")],
+     Output("status", "children"),
+     Output("rendered", "data")],
     [Input("interval-update", "n_intervals"),
-     Input("chart-type", "value")]
+     Input("chart-type", "value")],
+    State("rendered", "data")
 )
-def update_dashboard(_, chart_type):
-    if not os.path.exists(CSV_PATH):
-        return px.line(), "Waiting for Claude to generate a result..."
+def update_dashboard(_, chart_type, rendered):
+    # Each browser tab remembers what it last drew, so nothing is re-read or
+    # re-rendered until a new result is published or the chart type changes.
+    mtime = manifest_mtime()
+    if mtime == rendered["mtime"] and chart_type == rendered["chart_type"]:
+        raise PreventUpdate
+    rendered = {"mtime": mtime, "chart_type": chart_type}
+
+    manifest = feed.read_manifest()
+    if manifest is None:
+        return px.line(), "Waiting for Claude to generate a result...", rendered
 
     try:
-        df = pd.read_csv(CSV_PATH)
-        if df.empty:
-            return px.line(), "Data is empty. Waiting for Claude..."
+        columns = manifest["columns"]
+        if not columns or not manifest["rows"]:
+            return px.line(), "Data is empty. Waiting for Claude...", rendered
 
-        # Try to pick suitable x/y columns
-        x = df.columns[0]
-        y = df.columns[1] if df.shape[1] > 1 else df.columns[0]
+        # Try to pick suitable x/y columns, and load only those
+        x = columns[0]
+        y = columns[1] if len(columns) > 1 else columns[0]
+        df = feed.load(manifest, columns=list(dict.fromkeys([x, y])))
 
-        if chart_type == "bar":
-            fig = px.bar(df, x=x, y=y, hover_data=df.columns)
-        elif chart_type == "line":
-            fig = px.line(df, x=x, y=y, hover_data=df.columns)
-        elif chart_type == "scatter":
-            fig = px.scatter(df, x=x, y=y, hover_data=df.columns)
-        else:
-            fig = px.line()
+        if chart_type not in ("bar", "line", "scatter"):
+            return px.line(), f"Unsupported chart type: {chart_type}", rendered
+        fig, note = build_figure(df, x, y, chart_type)
 
         fig.update_layout(margin=dict(l=20, r=20, t=40, b=40))
-        return fig, f"Updated from: {CSV_PATH}"
+        status = f"Updated from: {manifest['path']} (version {manifest['version']})"
+        return fig, f"{status}; {note}" if note else status, rendered
 
     except Exception as e:
-        return px.line(), f"Error: {e}"
+        return px.line(), f"Error: {e}", rendered
 
 if __name__ == "__main__":
     app.run(debug=True, port=8050)
@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Per-connection tuning. WAL lets readers run while an ingest is writing.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64 * 1024,        # KiB, i.e. 64 MiB of page cache
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+BUSY_TIMEOUT = 30.0
+STATEMENT_CACHE = 256
+
+_local = threading.local()
+_all_connections = []
+_lock = threading.Lock()
+_generation = 0
+
+def quote(name):
+    # Quote an identifier for SQL text, escaping embedded double quotes.
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _open(db_path):
+    # check_same_thread is off only so close_all() can close connections owned by
+    # other threads; each connection is still used by a single thread.
+    conn = sqlite3.connect(
+        db_path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE, check_same_thread=False
+    )
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+def get_connection(db_path):
+    # One long-lived connection per (thread, database): keeps the page cache and
+    # prepared statements warm across tool calls.
+    conns = getattr(_local, "conns", None)
+    if conns is None or _local.generation != _generation:
+        conns = _local.conns = {}
+        _local.generation = _generation
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = conns[db_path] = _open(db_path)
+        with _lock:
+            _all_connections.append(conn)
+    return conn
+
+@contextmanager
+def transaction(db_path, mode="IMMEDIATE"):
+    conn = get_connection(db_path)
+    conn.execute(f"BEGIN {mode}")
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+def close_all():
+    global _generation
+    with _lock:
+        _generation += 1
+        for conn in _all_connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+        _all_connections.clear()
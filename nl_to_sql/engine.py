@@ -0,0 +1,251 @@
+import os
+import re
+import threading
+from importlib.util import find_spec
+
+from db import get_connection, quote
+from results import RESULT_MAX_BYTES, read_bounded, read_page
+from sql import detect_year_layout, long_table_name
+from sqlguard import MAX_COST, SQLRejected, _outside_quotes, add_limit, check, prepare, time_budget
+
+# Imported by DuckDBEngine, so the default SQLite engine does not pay for it at startup.
+duckdb = None
+# pyarrow (like pandas) is imported when a query first needs it.
+HAS_PYARROW = find_spec("pyarrow") is not None
+
+ENGINES = ("sqlite", "duckdb")
+DUCKDB_MODES = ("import", "csv")
+DUCKDB_TYPES = {"INTEGER": "BIGINT", "REAL": "DOUBLE", "TEXT": "VARCHAR"}
+ARROW_BATCH_ROWS = 64 * 1024
+COPY_BATCH_ROWS = 100_000
+# DuckDB table functions that read files or settings outside the mirrored tables.
+_EXTERNAL = re.compile(r"\b(read_\w+|\w+_scan|glob|sniff_csv|query|query_table|getenv)\s*\(", re.IGNORECASE)
+
+def literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def cast(column, duck_type):
+    # Values that do not fit the declared type become NULL; "true"/"false"
+    # flags land in integer columns as 1/0, as they do in SQLite.
+    expr = f"TRY_CAST({quote(column)} AS {duck_type})"
+    if duck_type == "BIGINT":
+        expr = f"COALESCE({expr}, TRY_CAST(TRY_CAST({quote(column)} AS BOOLEAN) AS BIGINT))"
+    return expr
+
+class SQLiteEngine:
+    name = "sqlite"
+    dialect = "SQLite"
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def connection(self):
+        return get_connection(self.db_path)
+
+    def execute(self, sql, max_rows, budget=None):
+        conn = self.connection()
+        with time_budget(conn, budget):
+            return read_bounded(conn, sql, max_rows)
+
+    def check(self, sql, row_count, limit=None, max_cost=MAX_COST):
+        return check(self.connection(), sql, row_count, limit=limit, max_cost=max_cost)
+
+    def read_page(self, sql, offset, limit):
+        return read_page(self.connection(), sql, offset, limit)
+
+    def sync(self, table, csv_path=None):
+        pass
+
+    def sync_missing(self, tables):
+        pass
+
+    def close(self):
+        pass
+
+class DuckDBEngine:
+    """Columnar, multi-threaded engine for read queries.
+
+    SQLite stays the system of record: ingest, the catalog, the caches and all
+    writes go through it. Every table is mirrored into DuckDB, either imported
+    into columnar storage (mode "import") or as a view that reads the source
+    CSV directly (mode "csv"), using the column names and types SQLite chose.
+    """
+
+    name = "duckdb"
+    dialect = "DuckDB"
+
+    def __init__(self, db_path, path, mode="import", threads=None):
+        global duckdb
+        try:
+            import duckdb
+        except ImportError as e:
+            raise RuntimeError("The duckdb engine needs the duckdb package (pip install 'nl-to-sql[duckdb]').") from e
+        if mode not in DUCKDB_MODES:
+            raise ValueError(f"Unknown DuckDB mode {mode!r}. Use one of: {', '.join(DUCKDB_MODES)}")
+        self.db_path = db_path
+        self.path = path
+        self.mode = mode
+        self._db = duckdb.connect(path)
+        if threads:
+            self._db.execute(f"SET threads = {int(threads)}")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def connection(self):
+        # DuckDB connections are not thread-safe; each worker gets its own cursor.
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self._db.cursor()
+        return cursor
+
+    def execute(self, sql, max_rows, budget=None):
+        conn = self.connection()
+        if not HAS_PYARROW:
+            return read_bounded(conn, sql, max_rows)
+        import pyarrow as pa
+
+        timer = threading.Timer(budget, conn.interrupt) if budget else None
+        if timer:
+            timer.start()
+        try:
+            result = conn.execute(sql)
+            reader = (result.to_arrow_reader if hasattr(result, "to_arrow_reader") else result.fetch_record_batch)(ARROW_BATCH_ROWS)
+            # Same bounds as read_bounded: rows past them are counted, not kept.
+            batches, kept, size, total = [], 0, 0, 0
+            for batch in reader:
+                if kept < max_rows and size < RESULT_MAX_BYTES:
+                    keep = batch.slice(0, max_rows - kept)
+                    batches.append(keep)
+                    kept += keep.num_rows
+                    size += keep.nbytes
+                total += batch.num_rows
+        except duckdb.InterruptException as e:
+            if timer and not timer.is_alive():
+                raise TimeoutError(f"query exceeded its {budget:g}s time budget") from e
+            raise
+        finally:
+            if timer:
+                timer.cancel()
+        df = pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+        df.attrs["total_rows"] = total
+        return df
+
+    def check(self, sql, row_count, limit=None, max_cost=MAX_COST):
+        """Validate a generated query against DuckDB, which is what runs it.
+
+        Like sqlguard.check, but the statement is parsed and bound by DuckDB,
+        and calls to table functions that read files are rejected. There is no
+        cost estimate; the time budget still bounds the run.
+        """
+        sql = prepare(sql)
+        if any(_EXTERNAL.search(part) for part in _outside_quotes(sql)):
+            raise SQLRejected("only the uploaded tables may be queried")
+        conn = self.connection()
+        try:
+            statements = conn.extract_statements(sql)
+            if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+                raise SQLRejected("only read-only SELECT queries are allowed")
+            conn.execute("EXPLAIN " + sql)
+        except duckdb.Error as e:
+            raise SQLRejected(str(e)) from e
+        return add_limit(sql, limit)
+
+    def read_page(self, sql, offset, limit):
+        return read_page(self.connection(), sql, offset, limit)
+
+    def tables(self):
+        rows = self.connection().execute(
+            "SELECT table_name FROM duckdb_tables() "
+            "UNION ALL SELECT view_name FROM duckdb_views() WHERE NOT internal AND NOT temporary"
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def _drop(self, conn, name):
+        kind = conn.execute(
+            "SELECT 'TABLE' FROM duckdb_tables() WHERE table_name = ? "
+            "UNION ALL SELECT 'VIEW' FROM duckdb_views() WHERE view_name = ? AND NOT internal AND NOT temporary",
+            (name, name),
+        ).fetchone()
+        if kind:
+            conn.execute(f"DROP {kind[0]} {quote(name)}")
+
+    def sync(self, table, csv_path=None):
+        """Mirror `table` (and its long table, if any) from SQLite into DuckDB.
+
+        With a `csv_path` the file is read by DuckDB itself; otherwise (after a
+        write, or for tables ingested before the engine was enabled) the rows
+        are copied out of SQLite.
+        """
+        columns = [
+            (row[1], DUCKDB_TYPES.get((row[2] or "TEXT").upper(), "VARCHAR"))
+            for row in get_connection(self.db_path).execute(f"PRAGMA table_info({quote(table)})")
+        ]
+        with self._lock:
+            conn = self.connection()
+            self._drop(conn, long_table_name(table))
+            self._drop(conn, table)
+            if not columns:
+                return
+            casts = ", ".join(f"{cast(c, t)} AS {quote(c)}" for c, t in columns)
+            kind = "VIEW" if csv_path and self.mode == "csv" else "TABLE"
+            try:
+                if not csv_path:
+                    raise LookupError(table)
+                names = "[" + ", ".join(literal(c) for c, _ in columns) + "]"
+                source = f"read_csv({literal(os.path.abspath(csv_path))}, header = true, all_varchar = true, names = {names})"
+                conn.execute(f"CREATE {kind} {quote(table)} AS SELECT {casts} FROM {source}")
+            except (LookupError, duckdb.Error):
+                # Files DuckDB's reader rejects (e.g. newlines in quoted headers) are copied too.
+                kind = "TABLE"
+                self._copy(conn, table, columns)
+            layout = detect_year_layout([c for c, _ in columns])
+            if layout:
+                self._create_long(conn, kind, table, *layout)
+
+    def _copy(self, conn, table, columns):
+        conn.execute(f"CREATE TABLE {quote(table)} ({', '.join(f'{quote(c)} {t}' for c, t in columns)})")
+        select = ", ".join(
+            f"CAST({quote(c)} AS TEXT)" if t == "VARCHAR"
+            else f"CASE WHEN typeof({quote(c)}) IN ('integer', 'real') THEN {quote(c)} END"
+            for c, t in columns
+        )
+        casts = ", ".join(cast(c, t) for c, t in columns)
+        import pandas as pd
+
+        cursor = get_connection(self.db_path).execute(f"SELECT {select} FROM {quote(table)}")
+        for rows in iter(lambda: cursor.fetchmany(COPY_BATCH_ROWS), []):
+            chunk = pd.DataFrame.from_records(rows, columns=[c for c, _ in columns], coerce_float=True)
+            conn.register("_sync_chunk", chunk)
+            try:
+                conn.execute(f"INSERT INTO {quote(table)} SELECT {casts} FROM _sync_chunk")
+            finally:
+                conn.unregister("_sync_chunk")
+
+    def _create_long(self, conn, kind, table, country, code, years):
+        # Same shape as the SQLite long table: one row per country and year, NULLs dropped.
+        ids = [country] + ([code] if code else [])
+        conn.execute(
+            f"CREATE {kind} {quote(long_table_name(table))} AS "
+            f"SELECT CAST({quote(country)} AS VARCHAR) AS country, "
+            f"{f'CAST({quote(code)} AS VARCHAR)' if code else 'CAST(NULL AS VARCHAR)'} AS code, "
+            "CAST(year AS INTEGER) AS year, CAST(value AS DOUBLE) AS value "
+            f"FROM (UNPIVOT (SELECT {', '.join([quote(c) for c in ids] + [f'TRY_CAST({quote(y)} AS DOUBLE) AS {quote(y)}' for y in years])} FROM {quote(table)}) "
+            f"ON {', '.join(quote(y) for y in years)} INTO NAME year VALUE value)"
+        )
+
+    def sync_missing(self, tables):
+        present = self.tables()
+        longs = {long_table_name(t) for t in tables}
+        for table in tables:
+            if table not in present and table not in longs:
+                self.sync(table)
+
+    def close(self):
+        self._db.close()
+
+def create_engine(name, db_path, duckdb_path=None, duckdb_mode="import", threads=None):
+    if name == "sqlite":
+        return SQLiteEngine(db_path)
+    if name == "duckdb":
+        return DuckDBEngine(db_path, duckdb_path or os.path.splitext(db_path)[0] + ".duckdb", duckdb_mode, threads)
+    raise ValueError(f"Unknown query engine {name!r}. Use one of: {', '.join(ENGINES)}")
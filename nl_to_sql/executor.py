@@ -0,0 +1,43 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from db import get_connection
+
+DB_WORKERS = int(os.getenv("DB_WORKERS") or 4)
+
+# Bounded pool for all blocking work, so a burst of requests queues here
+# instead of piling threads onto SQLite.
+_pool = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="nl2sql-db")
+
+async def run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_pool, lambda: fn(*args))
+
+async def run_db(db, fn, *args, timeout=None):
+    """Run `fn(*args)` on the worker pool with a deadline.
+
+    `db` is a SQLite path or a query engine, and `fn` uses the worker thread's
+    connection to it. If the deadline passes or the caller is cancelled, that
+    connection is interrupted so the statement stops instead of running on in
+    the background.
+    """
+    running = {}
+
+    def work():
+        running["conn"] = db.connection() if hasattr(db, "connection") else get_connection(db)
+        try:
+            return fn(*args)
+        finally:
+            running.pop("conn", None)
+
+    future = asyncio.get_running_loop().run_in_executor(_pool, work)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        conn = running.get("conn")
+        if conn is not None:
+            conn.interrupt()
+        raise
+
+def shutdown():
+    _pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from importlib.util import find_spec
+
+# pandas and pyarrow are imported by the functions that use them, so the MCP
+# server does not load them before its first export.
+HAS_PYARROW = find_spec("pyarrow") is not None
+
+DATA_DIR = "data"
+RESULT_BASENAME = os.path.join(DATA_DIR, "last_result")
+RESPONSE_PATH = os.path.join(DATA_DIR, "last_response.txt")
+MANIFEST_PATH = os.path.join(DATA_DIR, "last_result.json")
+
+# Feather (Arrow IPC) is written uncompressed so readers can memory-map it and
+# get columns without a copy; CSV stays available as an opt-in.
+FORMATS = ("feather", "parquet", "csv")
+DEFAULT_FORMAT = os.getenv("RESULT_FORMAT") or ("feather" if HAS_PYARROW else "csv")
+
+def _write_feather(df, path):
+    import pyarrow.feather as feather
+
+    feather.write_feather(df, path, compression="uncompressed")
+
+def _write_parquet(df, path):
+    df.to_parquet(path, index=False)
+
+def _write_csv(df, path):
+    df.to_csv(path, index=False)
+
+_WRITERS = {"feather": _write_feather, "parquet": _write_parquet, "csv": _write_csv}
+# Publishing reads the manifest version and writes shared file names, so
+# concurrent publishes (e.g. from two sessions) take turns.
+_publish_lock = threading.Lock()
+
+def _atomic_write(path, write):
+    # A temp file of its own in the same directory, so concurrent writers never
+    # share one and os.replace stays a rename on the same filesystem.
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or ".", prefix=".tmp-", delete=False) as f:
+        tmp = f.name
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def fingerprint(df, sql):
+    import pandas as pd
+
+    digest = hashlib.sha1((sql or "").encode("utf-8"))
+    digest.update(",".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+def read_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def publish(df, sql, fmt=None):
+    """Export a result for the dashboard, bumping the feed version.
+
+    The manifest is written last (atomically), so a reader that sees a new
+    version always finds the matching data file. Publishing the same result
+    in the same format again is a no-op.
+    """
+    fmt = fmt or DEFAULT_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format {fmt!r}. Use one of: {', '.join(FORMATS)}")
+    if fmt != "csv" and not HAS_PYARROW:
+        fmt = "csv"
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    key = fingerprint(df, sql)
+    with _publish_lock:
+        return _publish(df, sql, fmt, key)
+
+def _publish(df, sql, fmt, key):
+    manifest = read_manifest()
+    if manifest and manifest.get("fingerprint") == key and manifest.get("format") == fmt:
+        return manifest
+
+    df = df.reset_index(drop=True)
+    df.columns = [str(c) for c in df.columns]
+    path = f"{RESULT_BASENAME}.{fmt}"
+    errors = (TypeError, ValueError)
+    if fmt != "csv":
+        import pyarrow as pa
+        errors += (pa.ArrowException,)
+    try:
+        _atomic_write(path, lambda tmp: _WRITERS[fmt](df, tmp))
+    except errors:
+        # Mixed-type object columns cannot always become Arrow arrays.
+        if fmt == "csv":
+            raise
+        fmt, path = "csv", f"{RESULT_BASENAME}.csv"
+        _atomic_write(path, lambda tmp: _write_csv(df, tmp))
+
+    def write_response(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"SQL Query:\n{sql}\n\n")
+            f.write("Result Preview:\n")
+            f.write(df.head().to_string(index=False))
+    _atomic_write(RESPONSE_PATH, write_response)
+
+    manifest = {
+        "version": (manifest or {}).get("version", 0) + 1,
+        "fingerprint": key,
+        "path": path,
+        "format": fmt,
+        "columns": [str(c) for c in df.columns],
+        "rows": len(df),
+        "sql": sql,
+        "updated": time.time(),
+    }
+
+    def write_manifest(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+    _atomic_write(MANIFEST_PATH, write_manifest)
+    return manifest
+
+def load(manifest, columns=None, memory_map=True):
+    import pandas as pd
+
+    fmt = manifest.get("format", "csv")
+    if fmt == "feather":
+        import pyarrow.feather as feather
+        return feather.read_table(manifest["path"], columns=columns, memory_map=memory_map).to_pandas()
+    if fmt == "parquet":
+        return pd.read_parquet(manifest["path"], columns=columns, memory_map=memory_map)
+    return pd.read_csv(manifest["path"], usecols=columns)
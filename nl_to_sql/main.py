@@ -1,43 +1,235 @@
 import os
-import sqlite3
+import asyncio
+import atexit
+import shutil
+import threading
+import time
+import uuid
+import weakref
 import webbrowser
-import pandas as pd
 from dotenv import load_dotenv
-from mcp.server.fastmcp import FastMCP
-from anthropic import Anthropic
-from sql import csv_to_sqlite
-import plotly.express as px
+from mcp.server.fastmcp import FastMCP, Context
+from sql import csv_to_sqlite, log_progress, long_table_name
+from db import get_connection, transaction, close_all, quote
+from catalog import SchemaCatalog
+from sqlcache import SQLCache
+from resultcache import ResultCache, referenced_tables, is_read_only
+from executor import run_db, run_blocking, shutdown
+from session import SessionStore
+from advisor import IndexAdvisor
+import feed
+from sqlguard import SQLRejected, extract_sql
+from results import PAGE_ROWS, RESULT_ROW_CAP, format_page, parse_token, total_rows
+from engine import create_engine
+from metrics import Metrics
 
 # Load environment variables
 load_dotenv()
 DB_PATH = os.getenv("SQLITE_DB") or "sqlite.db"
 CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
+SQL_CACHE_PATH = os.getenv("SQL_CACHE_DB") or os.path.splitext(DB_PATH)[0] + "_sqlcache.db"
+SQL_CACHE_FUZZY = float(os.getenv("SQL_CACHE_FUZZY") or 0) or None
+RESULT_CACHE_BYTES = int(os.getenv("RESULT_CACHE_BYTES") or 256 * 1024 * 1024)
+RESULT_CACHE_SPILL = os.getenv("RESULT_CACHE_SPILL", "1") != "0"
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT") or 30)
+QUERY_BUDGET = float(os.getenv("QUERY_BUDGET") or QUERY_TIMEOUT)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT") or 60)
+SQL_ROW_LIMIT = int(os.getenv("SQL_ROW_LIMIT") or RESULT_ROW_CAP)
+SQL_MAX_COST = float(os.getenv("SQL_MAX_COST") or 1e9)
+SESSION_HISTORY = int(os.getenv("SESSION_HISTORY") or 5)
+SESSION_MEMORY_BYTES = int(os.getenv("SESSION_MEMORY_BYTES") or 512 * 1024 * 1024)
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT") or 3600)
+INDEX_ADVISOR_AUTO = os.getenv("INDEX_ADVISOR_AUTO", "0") == "1"
+INDEX_ADVISOR_TIMEOUT = float(os.getenv("INDEX_ADVISOR_TIMEOUT") or 300)
+QUERY_ENGINE = os.getenv("QUERY_ENGINE") or "sqlite"
+DUCKDB_PATH = os.getenv("DUCKDB_PATH") or None
+DUCKDB_MODE = os.getenv("DUCKDB_MODE") or "import"
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS") or 0) or None
+METRICS_ENABLED = os.getenv("METRICS", "1") != "0"
+METRICS_FILE = os.getenv("METRICS_FILE") or None
+METRICS_EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL") or 15)
 
 # Initialize MCP and Claude
 mcp = FastMCP("NL_TO_SQL_BOT")
-claude = Anthropic(api_key=CLAUDE_API_KEY) if CLAUDE_API_KEY else None
+metrics = Metrics(enabled=METRICS_ENABLED, export_path=METRICS_FILE, export_interval=METRICS_EXPORT_INTERVAL)
+claude = None
+# Built by init_state() on the first tool call, so starting the server does
+# not open the database, the engine or the caches.
+catalog = engine = sql_cache = result_cache = advisor = sessions = None
+_state_lock = threading.Lock()
+
+atexit.register(shutdown)
+atexit.register(metrics.export)
+atexit.register(close_all)
 
 # Create data directory if needed
 os.makedirs("data", exist_ok=True)
 
-# Global variables
-uploaded_table = None
-last_sql = None
-last_df = None
+COPY_BLOCK_SIZE = 1024 * 1024
+
+def get_claude():
+    # The Anthropic SDK takes about a second to import, so the client is built
+    # on first use (or by the warm-up thread started with the server).
+    global claude
+    if claude is None and CLAUDE_API_KEY:
+        from anthropic import AsyncAnthropic
+        claude = AsyncAnthropic(api_key=CLAUDE_API_KEY)
+    return claude
+
+def init_state():
+    global catalog, engine, sql_cache, result_cache, advisor, sessions
+    if sessions is not None:
+        return
+    with _state_lock:
+        if sessions is not None:
+            return
+        catalog = SchemaCatalog(DB_PATH)
+        engine = create_engine(QUERY_ENGINE, DB_PATH, DUCKDB_PATH, DUCKDB_MODE, DUCKDB_THREADS)
+        engine.sync_missing(catalog.tables())
+        sql_cache = SQLCache(SQL_CACHE_PATH, fuzzy_threshold=SQL_CACHE_FUZZY)
+        result_cache = ResultCache(
+            max_bytes=RESULT_CACHE_BYTES,
+            spill_dir=os.path.join("data", "result_cache") if RESULT_CACHE_SPILL else None,
+        )
+        advisor = IndexAdvisor(DB_PATH, catalog, auto_apply=INDEX_ADVISOR_AUTO)
+        atexit.register(engine.close)
+        atexit.register(catalog.close)
+        atexit.register(sql_cache.close)
+        atexit.register(result_cache.clear)
+        # Assigned last: other threads take a non-None `sessions` to mean ready.
+        sessions = SessionStore(
+            max_history=SESSION_HISTORY,
+            max_bytes=SESSION_MEMORY_BYTES,
+            idle_timeout=SESSION_IDLE_TIMEOUT,
+            spill_dir=os.path.join("data", "sessions"),
+        )
+        atexit.register(sessions.close)
+
+_session_ids = weakref.WeakKeyDictionary()
 
-def quote(name):
-    return f'"{name}"'
+def get_session(ctx):
+    # Concurrent MCP clients each get their own tables and results. Calls made
+    # outside a request (e.g. in-process) share the default session.
+    if ctx is None:
+        return sessions.get()
+    try:
+        session_id = ctx.client_id or _session_ids.get(ctx.session)
+        if session_id is None:
+            # Keyed on the connection object itself: id() values are reused
+            # once a connection is gone, which would hand its state to a new client.
+            session_id = _session_ids[ctx.session] = f"session-{uuid.uuid4().hex}"
+    except ValueError:
+        session_id = None
+    return sessions.get(session_id)
+
+def last_result_df(session):
+    result = session.last_result
+    return result.load() if result is not None else None
+
+def load_page(result, offset, fmt="markdown"):
+    df = result.load()
+    if df is not None and (offset + PAGE_ROWS <= len(df) or len(df) >= result.total_rows):
+        page = df.iloc[offset:offset + PAGE_ROWS]
+    elif is_read_only(result.sql):
+        page = engine.read_page(result.sql, offset, PAGE_ROWS)
+    else:
+        import pandas as pd
+        page = pd.DataFrame()
+    return format_page(page, offset, result.total_rows, result.id, fmt, result.total_capped)
+
+def record_result(tool, result):
+    metrics.observe("result_rows", result.total_rows, tool=tool)
+    metrics.observe("result_bytes", result.nbytes, tool=tool)
 
 def get_table_schema(table_name):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.execute(f'PRAGMA table_info({quote(table_name)})')
-    schema = "\n".join([f"{row[1]} ({row[2]})" for row in cursor.fetchall()])
-    conn.close()
-    return schema
+    return catalog.describe(table_name)
+
+def run_query(sql):
+    tables = referenced_tables(sql, catalog.tables())
+    if not is_read_only(sql):
+        # Writes bypass the cache, are committed right away (the connection is
+        # long-lived, so an open transaction would hold the write lock) and
+        # invalidate whatever they touched.
+        conn = get_connection(DB_PATH)
+        with conn:
+            cursor = conn.execute(sql)
+            rows = cursor.fetchall() if cursor.description else []
+        columns = [d[0] for d in cursor.description] if cursor.description else []
+        import pandas as pd
+        df = pd.DataFrame(rows, columns=columns)
+        # The statement may have created tables the list did not have yet, so
+        # its tables are resolved again against the re-read list.
+        catalog.reload_table_names()
+        touched = sorted(set(tables) | set(referenced_tables(sql, catalog.tables())))
+        for table in touched:
+            catalog.invalidate(table)
+        # Mirror the same set into the engine: new tables are copied, dropped
+        # ones removed, and anything the parse missed is picked up by name.
+        for table in touched:
+            engine.sync(table)
+        engine.sync_missing(catalog.tables())
+        return df
+
+    # Without a known table there is no data version to key on (e.g. a table
+    # created by another process since the last poll), so nothing is cached.
+    cacheable = bool(tables)
+    versions = [(table, catalog.version(table)) for table in tables]
+    df = result_cache.get(sql, versions) if cacheable else None
+    if df is None:
+        start = time.perf_counter()
+        df = engine.execute(sql, RESULT_ROW_CAP, QUERY_BUDGET)
+        if total_rows(df) == SQL_ROW_LIMIT:
+            # Most likely cut off by the LIMIT guard_sql added; the true count is unknown.
+            df.attrs["total_capped"] = True
+        if engine.name == "sqlite":
+            # Index advice only applies to queries SQLite itself executed.
+            advisor.record(sql, time.perf_counter() - start)
+        if cacheable:
+            result_cache.put(sql, versions, df)
+    return df
+
+def table_rows(table):
+    info = catalog.get(table)
+    return info.row_count if info is not None else None
+
+def guard_sql(sql):
+    # Generated SQL must be one read-only statement that compiles against the
+    # schema of the engine that will run it and (on SQLite) is not estimated
+    # to visit more than SQL_MAX_COST rows.
+    return engine.check(sql, table_rows, limit=SQL_ROW_LIMIT, max_cost=SQL_MAX_COST)
+
+def copy_file(src_path, target_path):
+    with open(src_path, "rb") as src, open(target_path, "wb") as dest:
+        shutil.copyfileobj(src, dest, COPY_BLOCK_SIZE)
+
+def ingest(csv_path, progress):
+    table = csv_to_sqlite(csv_path, DB_PATH, progress=progress)
+    if not table:
+        return None
+
+    # Rename if hyphens exist
+    sanitized = table.replace("-", "_")
+    if sanitized != table:
+        with transaction(DB_PATH) as conn:
+            conn.execute(f'DROP TABLE IF EXISTS {quote(sanitized)}')
+            conn.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(sanitized)}')
+        catalog.invalidate(table)
+        table = sanitized
+
+    # Warm the catalog now so prompt building never has to touch the database.
+    catalog.refresh(table)
+    long_name = long_table_name(table)
+    catalog.invalidate(long_name)
+    if long_name in catalog.tables():
+        catalog.refresh(long_name)
+    engine.sync(table, csv_path)
+    return table
 
 @mcp.tool()
-def upload_csv(file_path: str) -> str:
-    global uploaded_table
+@metrics.traced("upload_csv")
+async def upload_csv(file_path: str, in_place: bool = False, ctx: Context = None) -> str:
+    await run_blocking(init_state)
+    session = get_session(ctx)
 
     abs_path = os.path.abspath(file_path)
     if not os.path.exists(abs_path):
@@ -46,46 +238,94 @@ def upload_csv(file_path: str) -> str:
     filename = os.path.basename(abs_path)
     target_path = os.path.join("data", filename)
 
+    # Ingest in place when asked to, or when the file already lives in data/
+    # (copying a file onto itself would truncate it).
+    if in_place or (os.path.exists(target_path) and os.path.samefile(abs_path, target_path)):
+        target_path = abs_path
+    else:
+        try:
+            with metrics.span("upload_csv", "copy"):
+                await run_blocking(copy_file, abs_path, target_path)
+        except Exception as e:
+            return f"Failed to read/write file: {e}"
+
+    stats = {}
+    def progress(rows, elapsed):
+        stats.update(rows=rows, elapsed=elapsed)
+        log_progress(rows, elapsed)
+
+    metrics.observe("upload_bytes", os.path.getsize(target_path), tool="upload_csv")
     try:
-        with open(abs_path, "r", encoding="utf-8") as src, open(target_path, "w", encoding="utf-8") as dest:
-            dest.write(src.read())
+        with metrics.span("upload_csv", "ingest"):
+            table = await run_db(DB_PATH, ingest, target_path, progress)
     except Exception as e:
-        return f"Failed to read/write file: {e}"
-
-    uploaded_table = csv_to_sqlite(target_path, DB_PATH)
-    if not uploaded_table:
+        return f"CSV uploaded, but failed to convert to SQLite table: {e}"
+    if not table:
         return "CSV uploaded, but failed to convert to SQLite table."
+    session.use_table(table)
+
+    rows, elapsed = stats.get("rows", 0), stats.get("elapsed", 0)
+    metrics.observe("ingest_rows", rows, tool="upload_csv")
+    rate = f"{rows / elapsed:,.0f} rows/s" if elapsed else "n/a"
+    return f"CSV file loaded and converted to table: **{table}** ({rows:,} rows, {rate})"
+
+def build_context(query, preferred):
+    # Only the tables and columns relevant to the question go into the prompt,
+    # so its size does not grow with the catalog.
+    tables = catalog.select_tables(query, preferred=preferred)
+    if not tables:
+        return [], None, ""
+    # The engine is part of the key: SQL generated for one dialect is not reused for the other.
+    return tables, f"{engine.name}:{catalog.schema_hash(tables)}", catalog.prompt_context(query, tables)
+
+async def generate_sql(prompt):
+    with metrics.span("nl_to_sql", "llm"):
+        response = await asyncio.wait_for(
+            get_claude().messages.create(
+                model="claude-3-sonnet-20240229",
+                max_tokens=300,
+                temperature=0,
+                messages=[{"role": "user", "content": prompt}]
+            ),
+            LLM_TIMEOUT,
+        )
 
-    # Rename if hyphens exist
-    sanitized = uploaded_table.replace("-", "_")
-    if sanitized != uploaded_table:
-        conn = sqlite3.connect(DB_PATH)
-        conn.execute(f'ALTER TABLE {quote(uploaded_table)} RENAME TO {quote(sanitized)}')
-        conn.commit()
-        conn.close()
-        uploaded_table = sanitized
-
-    return f"CSV file loaded and converted to table: **{uploaded_table}**"
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metrics.observe("llm_tokens", usage.input_tokens, kind="input")
+        metrics.observe("llm_tokens", usage.output_tokens, kind="output")
+    return extract_sql(response.content[0].text)
 
 @mcp.tool()
-def nl_to_sql(query: str) -> str:
-    global uploaded_table, last_sql, last_df
-
-    if not uploaded_table:
+@metrics.traced("nl_to_sql")
+async def nl_to_sql(query: str, ctx: Context = None) -> str:
+    await run_blocking(init_state)
+    session = get_session(ctx)
+    sql = None
+
+    with metrics.span("nl_to_sql", "context"):
+        tables, schema_key, schema = await run_blocking(build_context, query, session.tables)
+    if not tables:
         return "No CSV file uploaded yet. Please upload a file using `upload_csv()`."
 
-    if not claude:
-        return "Claude API key missing or invalid. Please set CLAUDE_API_KEY in your .env file."
+    # Repeated questions against an unchanged schema skip the LLM round trip.
+    with metrics.span("nl_to_sql", "sql_cache"):
+        cached_sql = await run_blocking(sql_cache.get, query, schema_key)
+    metrics.inc("sql_cache_lookups_total", result="hit" if cached_sql else "miss")
 
-    schema = get_table_schema(uploaded_table)
+    if not cached_sql and not await run_blocking(get_claude):
+        return "Claude API key missing or invalid. Please set CLAUDE_API_KEY in your .env file."
 
     prompt = f"""
-You are a professional SQL generator. A user uploaded a CSV file, which is now a SQLite table named "{uploaded_table}".
+You are a professional SQL generator. The user's CSV files have been loaded into {engine.dialect} tables.
 
-The schema of the table is:
+The tables relevant to the question, with a few column statistics, are:
 {schema}
 
-Your task is to convert natural language questions into pure SQL queries. DO NOT provide JavaScript, Python, explanations, markdown, or anything else — only valid SQL.
+Join tables on the listed join keys when the question needs more than one.
+Tables ending in "_long" hold the same yearly values as one (country, code, year, value) row per country and year, indexed on (code, year) and (year, value); prefer them for questions spanning several years or ranking by year.
+
+Your task is to convert natural language questions into pure {engine.dialect} SQL queries. DO NOT provide JavaScript, Python, explanations, markdown, or anything else — only valid SQL.
 
 Wrap table and column names in double quotes.
 
@@ -96,91 +336,197 @@ Respond with only the SQL query.
 """.strip()
 
     try:
-        response = claude.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=300,
-            temperature=0,
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        sql = response.content[0].text.strip()
-        if sql.startswith("```sql"):
-            sql = sql.replace("```sql", "").replace("```", "").strip()
-
-        last_sql = sql
-        conn = sqlite3.connect(DB_PATH)
-        last_df = pd.read_sql_query(sql, conn)
-        conn.close()
+        sql = cached_sql or await generate_sql(prompt)
+        try:
+            with metrics.span("nl_to_sql", "validate"):
+                sql = await run_db(engine, guard_sql, sql, timeout=QUERY_TIMEOUT)
+        except SQLRejected as e:
+            if not await run_blocking(get_claude):
+                raise
+            # One retry, telling the model why its query was rejected.
+            sql = await generate_sql(
+                f"{prompt}\n\nYour previous answer was:\n{sql}\n\nIt was rejected: {e}\n"
+                "Respond with a corrected SQL query only."
+            )
+            metrics.inc("sql_retries_total", tool="nl_to_sql")
+            with metrics.span("nl_to_sql", "validate"):
+                sql = await run_db(engine, guard_sql, sql, timeout=QUERY_TIMEOUT)
+
+        with metrics.span("nl_to_sql", "execute"):
+            last_df = await run_db(engine, run_query, sql, timeout=QUERY_TIMEOUT)
+        result = await run_blocking(sessions.add_result, session, sql, last_df)
+        record_result("nl_to_sql", result)
+        if sql != cached_sql:
+            await run_blocking(sql_cache.put, query, schema_key, sql)
+
+        try:
+            with metrics.span("nl_to_sql", "export"):
+                await publish_last(session)  # ✅ Auto-export for Dash dashboard
+        except Exception:
+            pass  # counted as a stage error; the dashboard keeps its previous result
+        with metrics.span("nl_to_sql", "browser"):
+            await run_blocking(webbrowser.open, "http://127.0.0.1:8050")
+
+        with metrics.span("nl_to_sql", "format"):
+            page = await run_blocking(load_page, result, 0)
+        metrics.observe("response_chars", len(page), tool="nl_to_sql")
+        return f"**Generated SQL Query:**\n```sql\n{sql}\n```\n\n**Query Result:**\n{page}"
+
+    except SQLRejected as e:
+        return f"**Generated SQL Query:**\n```sql\n{sql if sql else '[NO SQL GENERATED]'}\n```\n\n**SQL rejected:** {e}"
+    except asyncio.TimeoutError as e:
+        return f"**Generated SQL Query:**\n```sql\n{sql if sql else '[NO SQL GENERATED]'}\n```\n\n**Error:** {str(e) or 'timed out.'}"
+    except Exception as e:
+        return f"**Generated SQL Query:**\n```sql\n{sql if sql else '[NO SQL GENERATED]'}\n```\n\n**Error executing SQL query:**\n```\n{e}\n```"
 
-        export_for_dash()  # ✅ Auto-export for Dash dashboard
-        webbrowser.open("http://127.0.0.1:8050") 
-        
-        return f"**Generated SQL Query:**\n```sql\n{sql}\n```\n\n**Query Result:**\n{last_df.to_markdown(index=False)}"
+@mcp.tool()
+@metrics.traced("run_sql_manual")
+async def run_sql_manual(sql: str, ctx: Context = None) -> str:
+    await run_blocking(init_state)
+    session = get_session(ctx)
 
+    try:
+        with metrics.span("run_sql_manual", "execute"):
+            last_df = await run_db(engine, run_query, sql, timeout=QUERY_TIMEOUT)
+        result = await run_blocking(sessions.add_result, session, sql, last_df)
+        record_result("run_sql_manual", result)
+        try:
+            with metrics.span("run_sql_manual", "export"):
+                await publish_last(session)
+        except Exception:
+            pass  # counted as a stage error; the dashboard keeps its previous result
+        with metrics.span("run_sql_manual", "format"):
+            page = await run_blocking(load_page, result, 0, "text")
+        metrics.observe("response_chars", len(page), tool="run_sql_manual")
+        return page
+    except asyncio.TimeoutError as e:
+        return f"Error running SQL manually:\n{str(e) or f'Query timed out after {QUERY_TIMEOUT:g}s.'}"
     except Exception as e:
-        return f"**Generated SQL Query:**\n```sql\n{last_sql if last_sql else '[NO SQL GENERATED]'}\n```\n\n**Error executing SQL query:**\n```\n{e}\n```"
+        return f"Error running SQL manually:\n{e}"
+
+@mcp.tool()
+def get_metrics(format: str = "text", reset: bool = False) -> str:
+    """Per-stage latency percentiles, row/byte/token sizes and counters since start
+    (or the last reset). Use format="prometheus" for the text exposition format."""
+    text = metrics.prometheus() if format == "prometheus" else metrics.report()
+    if reset:
+        metrics.reset()
+    return text
 
 @mcp.tool()
-def run_sql_manual(sql: str) -> str:
-    global last_df, last_sql
+async def cache_stats() -> str:
+    await run_blocking(init_state)
+    lines = ["SQL generation cache:"]
+    lines += [f"  {name}: {value}" for name, value in sql_cache.stats().items()]
+    lines.append("Query result cache:")
+    lines += [f"  {name}: {value}" for name, value in result_cache.stats().items()]
+    lines.append("Sessions:")
+    lines += [f"  {name}: {value}" for name, value in sessions.stats().items()]
+    return "\n".join(lines)
+
+def advise(apply, drop_unused):
+    lines = []
+    candidates = advisor.candidates()
+    if apply:
+        advisor.apply(candidates)
+    for c in candidates:
+        line = f"{c.table}.{c.column}: used {c.uses}x, estimated {c.estimated_speedup}x"
+        if c.measured_speedup is not None:
+            line += f", measured {c.measured_speedup}x (created {c.index})"
+        lines.append(line)
+    if not lines:
+        lines.append("No index candidates in the recorded workload.")
+    unused = advisor.unused_indexes()
+    if drop_unused and unused:
+        advisor.drop([name for name, _ in unused])
+        lines.append("Dropped unused indexes: " + ", ".join(name for name, _ in unused))
+    elif unused:
+        lines.append("Unused indexes: " + ", ".join(name for name, _ in unused))
+    return "\n".join(lines)
 
+@mcp.tool()
+async def advise_indexes(apply: bool = False, drop_unused: bool = False) -> str:
+    """Suggest indexes from recent queries; create them with apply=True."""
+    await run_blocking(init_state)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        last_df = pd.read_sql_query(sql, conn)
-        conn.close()
-        last_sql = sql
-        export_for_dash()
-        return last_df.to_string(index=False)
+        return await run_db(DB_PATH, advise, apply, drop_unused, timeout=INDEX_ADVISOR_TIMEOUT)
+    except asyncio.TimeoutError:
+        return f"Index advice timed out after {INDEX_ADVISOR_TIMEOUT:g}s."
     except Exception as e:
-        return f"Error running SQL manually:\n{e}"
+        return f"Error advising indexes: {e}"
 
 @mcp.tool()
-def show_answer() -> str:
-    global last_df
+async def show_answer(ctx: Context = None) -> str:
+    await run_blocking(init_state)
+    result = get_session(ctx).last_result
 
-    if last_df is None or last_df.empty:
+    if result is None or result.evicted or not result.total_rows:
         return "No result to display."
-    return last_df.to_string(index=False)
+    return await run_blocking(load_page, result, 0, "text")
 
 @mcp.tool()
-def show_table_head(n: int = 5) -> str:
-    global uploaded_table
+async def fetch_page(page_token: str, ctx: Context = None) -> str:
+    """Fetch the next page of an earlier result, using the token shown under it."""
+    try:
+        result_id, offset = parse_token(page_token)
+    except ValueError:
+        return "Invalid page token."
+    await run_blocking(init_state)
+    result = get_session(ctx).find(result_id)
+    if result is None:
+        return "This result is no longer available. Please run the query again."
+    try:
+        return await run_db(engine, load_page, result, offset, timeout=QUERY_TIMEOUT)
+    except Exception as e:
+        return f"Error fetching page: {e}"
+
+@mcp.tool()
+async def show_table_head(n: int = 5, ctx: Context = None) -> str:
+    await run_blocking(init_state)
+    uploaded_table = get_session(ctx).active_table
     if not uploaded_table:
         return "No table uploaded."
 
+    sql = f'SELECT * FROM {quote(uploaded_table)} LIMIT {int(n)}'
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query(f'SELECT * FROM {quote(uploaded_table)} LIMIT {n}', conn)
-        conn.close()
+        df = await run_db(engine, engine.execute, sql, int(n), timeout=QUERY_TIMEOUT)
         return df.to_string(index=False)
     except Exception as e:
         return f"Error: {e}"
 
-@mcp.tool()
-def export_for_dash() -> str:
-    global last_df, last_sql
+async def publish_last(session, file_format=None):
+    # Write the session's last result to the dashboard feed; None if there is nothing to export.
+    result = session.last_result
+    last_df = await run_blocking(result.load) if result is not None else None
     if last_df is None or last_df.empty:
-        return "No result to export."
+        return None
+    return await run_blocking(feed.publish, last_df, result.sql, file_format)
 
+@mcp.tool()
+async def export_for_dash(file_format: str = "", ctx: Context = None) -> str:
+    """Export the last result for the dashboard as feather (default), parquet or csv."""
+    await run_blocking(init_state)
     try:
-        os.makedirs("data", exist_ok=True)
-        csv_path = os.path.join("data", "last_result.csv")
-        txt_path = os.path.join("data", "last_response.txt")
-
-        last_df.to_csv(csv_path, index=False)
-
-        with open(txt_path, "w", encoding="utf-8") as f:
-            f.write(f"SQL Query:\n{last_sql}\n\n")
-            f.write("Result Preview:\n")
-            f.write(last_df.head().to_string(index=False))
-
-        return "Result exported for Dash successfully."
+        manifest = await publish_last(get_session(ctx), file_format or None)
     except Exception as e:
         return f"Error exporting: {e}"
+    if manifest is None:
+        return "No result to export."
+    return f"Result exported for Dash successfully ({manifest['format']}: {manifest['path']})."
+
+def write_plot(df, x_column, y_column, kind, graph_path):
+    from plotting import build_figure  # plotly is only needed once a plot is drawn
+
+    fig, note = build_figure(df, x_column, y_column, kind)
+    fig.write_html(graph_path)
+    return note
 
 @mcp.tool()
-def show_plot(x_column: str, y_column: str, kind: str = "bar") -> str:
-    global last_df
+@metrics.traced("show_plot")
+async def show_plot(x_column: str, y_column: str, kind: str = "bar", ctx: Context = None) -> str:
+    await run_blocking(init_state)
+    with metrics.span("show_plot", "load"):
+        last_df = await run_blocking(last_result_df, get_session(ctx))
 
     if last_df is None or last_df.empty:
         return "No data available to plot. Please run a query first."
@@ -188,25 +534,25 @@ def show_plot(x_column: str, y_column: str, kind: str = "bar") -> str:
     if x_column not in last_df.columns or y_column not in last_df.columns:
         return f"Invalid column names. Available columns: {', '.join(last_df.columns)}"
 
-    try:
-        fig = None
-        if kind == "bar":
-            fig = px.bar(last_df, x=x_column, y=y_column, hover_data=last_df.columns)
-        elif kind == "line":
-            fig = px.line(last_df, x=x_column, y=y_column, hover_data=last_df.columns)
-        elif kind == "scatter":
-            fig = px.scatter(last_df, x=x_column, y=y_column, hover_data=last_df.columns)
-        else:
-            return "Unsupported plot type. Use 'bar', 'line', or 'scatter'."
+    if kind not in ("bar", "line", "scatter"):
+        return "Unsupported plot type. Use 'bar', 'line', or 'scatter'."
 
+    try:
         os.makedirs("data", exist_ok=True)
         graph_path = os.path.join("data", "last_plot.html")
-        fig.write_html(graph_path)
+        with metrics.span("show_plot", "render"):
+            note = await run_blocking(write_plot, last_df, x_column, y_column, kind, graph_path)
+        metrics.observe("plot_rows", len(last_df), tool="show_plot")
+        metrics.observe("plot_bytes", os.path.getsize(graph_path), tool="show_plot")
 
-        return f"Graph generated successfully. Open `data/last_plot.html` to view it."
+        suffix = f" ({note})" if note else ""
+        return f"Graph generated successfully{suffix}. Open `data/last_plot.html` to view it."
 
     except Exception as e:
         return f"Error generating graph: {e}"
 
 if __name__ == "__main__":
+    # Load the LLM client in the background so the first question does not pay
+    # for the import, without holding up the MCP handshake.
+    threading.Thread(target=get_claude, daemon=True).start()
     mcp.run()
@@ -0,0 +1,172 @@
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+WINDOW = 1024
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+EXPORT_INTERVAL = 15.0
+PREFIX = "nl2sql_"
+
+_NULL_SPAN = nullcontext()
+
+class Histogram:
+    """Count and sum over all samples; quantiles over the last `window` of them."""
+
+    __slots__ = ("count", "sum", "samples")
+
+    def __init__(self, window=WINDOW):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def quantiles(self, quantiles=QUANTILES):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in quantiles}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in quantiles}
+
+def _labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+class Metrics:
+    """In-memory stage timings, sizes and counters for the MCP tools.
+
+    `span(tool, stage)` times a block into the `stage_seconds` histogram;
+    `observe` and `inc` record other values (rows, bytes, tokens). When
+    disabled every call returns immediately and spans are a shared no-op
+    context. With an `export_path`, a Prometheus text exposition is written
+    there (atomically) at most every `export_interval` seconds.
+    """
+
+    def __init__(self, enabled=True, export_path=None, export_interval=EXPORT_INTERVAL, window=WINDOW):
+        self.enabled = enabled
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self.window = window
+        self.started = time.time()
+        self._histograms = {}
+        self._counters = {}
+        self._last_export = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        if not self.enabled or value is None:
+            return
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.window)
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def span(self, tool, stage):
+        return self._span(tool, stage) if self.enabled else _NULL_SPAN
+
+    @contextmanager
+    def _span(self, tool, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("stage_errors_total", tool=tool, stage=stage)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, tool=tool, stage=stage)
+            if stage == "total":
+                self.inc("tool_calls_total", tool=tool)
+                self.maybe_export()
+
+    def traced(self, tool):
+        """Decorator timing every call of an async tool as its "total" stage."""
+        def decorate(fn):
+            if not self.enabled:
+                return fn
+
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.span(tool, "total"):
+                    return await fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    def report(self):
+        if not self.enabled:
+            return "Metrics are disabled (set METRICS=1 to enable)."
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            lines = [f"Since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started))}:"]
+            for (name, labels), h in histograms:
+                q = h.quantiles()
+                scale, unit = (1000, "ms") if name.endswith("_seconds") else (1, "")
+                label = name.removesuffix("_seconds") + (" " + " ".join(f"{k}={v}" for k, v in labels) if labels else "")
+                lines.append(
+                    f"  {label}: n={h.count} mean={h.sum / h.count * scale:,.1f}{unit} "
+                    f"p50={q[0.5] * scale:,.1f}{unit} p95={q[0.95] * scale:,.1f}{unit} p99={q[0.99] * scale:,.1f}{unit}"
+                )
+            for (name, labels), value in counters:
+                label = name + (" " + " ".join(f"{k}={v}" for k, v in labels) if labels else "")
+                lines.append(f"  {label}: {value:,}")
+        return "\n".join(lines)
+
+    def prometheus(self):
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), h in sorted(self._histograms.items()):
+                metric = PREFIX + name
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} summary")
+                for q, value in h.quantiles().items():
+                    lines.append(f"{metric}{_labels(labels, ('quantile', q))} {value}")
+                lines.append(f"{metric}_sum{_labels(labels)} {h.sum}")
+                lines.append(f"{metric}_count{_labels(labels)} {h.count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = PREFIX + name
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        if not self.enabled or not self.export_path:
+            return
+        tmp = f"{self.export_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, self.export_path)
+        self._last_export = time.monotonic()
+
+    def maybe_export(self):
+        if self.export_path and time.monotonic() - self._last_export >= self.export_interval:
+            try:
+                self.export()
+            except OSError:
+                pass
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+MAX_POINTS = 2000
+MAX_BARS = 30
+MAX_HOVER_COLUMNS = 3
+HEATMAP_BINS = 60
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of `n_out` points preserving the line's shape."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+def _numeric(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.astype("int64").to_numpy(dtype=float)
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+
+def downsample_line(df, x, y, max_points=MAX_POINTS):
+    if len(df) <= max_points:
+        return df
+    df = df.sort_values(x) if pd.api.types.is_numeric_dtype(df[x]) or pd.api.types.is_datetime64_any_dtype(df[x]) else df
+    df = df[df[y].notna()]
+    xs = _numeric(df[x])
+    if np.isnan(xs).any():
+        xs = np.arange(len(df), dtype=float)
+    ys = _numeric(df[y])
+    if np.isnan(ys).any():
+        # Non-numeric y: keep an even stride instead.
+        return df.iloc[np.linspace(0, len(df) - 1, max_points).astype(int)]
+    return df.iloc[lttb(xs, ys, max_points)]
+
+def top_n_bars(df, x, y, max_bars=MAX_BARS):
+    """Return (data, y column) for at most `max_bars` bars.
+
+    Numeric y values are summed per x value; otherwise (or when x is y) each
+    bar counts the rows with that x value. Past the top max_bars - 1 values
+    the rest are summed into "Other".
+    """
+    if pd.api.types.is_numeric_dtype(df[y]) and x != y:
+        if df[x].nunique() <= max_bars and len(df) <= MAX_POINTS:
+            return df, y
+        totals = df.groupby(x, sort=False)[y].sum()
+    else:
+        y = "rows" if x == "count" else "count"
+        totals = df.groupby(x, sort=False).size().rename(y)
+    totals = totals.sort_values(ascending=False)
+    if len(totals) <= max_bars:
+        return totals.reset_index(), y
+    out = totals.iloc[:max_bars - 1].reset_index()
+    out[x] = out[x].astype(str)
+    other = totals.iloc[max_bars - 1:].sum()
+    return pd.concat([out, pd.DataFrame({x: ["Other"], y: [other]})], ignore_index=True), y
+
+def density_heatmap(df, x, y, bins=HEATMAP_BINS):
+    # Binned here rather than by px.density_heatmap, which would embed every point.
+    data = df[list(dict.fromkeys([x, y]))].dropna()
+    counts, x_edges, y_edges = np.histogram2d(data[x].to_numpy(float), data[y].to_numpy(float), bins=bins)
+    fig = go.Figure(go.Heatmap(
+        z=counts.T,
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        colorscale="Viridis",
+        colorbar={"title": "count"},
+    ))
+    fig.update_layout(xaxis_title=x, yaxis_title=y)
+    return fig
+
+def hover_columns(df, x, y, max_columns=MAX_HOVER_COLUMNS):
+    return [c for c in df.columns if c not in (x, y)][:max_columns]
+
+def build_figure(df, x, y, kind):
+    """Build a figure whose size is bounded regardless of the number of rows.
+
+    Lines are LTTB-downsampled (or strided for non-numeric y), large scatters
+    become a 2D density heatmap or a sample, and bars keep the top categories
+    with the rest summed into "Other"; bars of non-numeric y count rows per x
+    value. Hover data is limited to a few extra columns.
+    """
+    note = None
+    if kind == "line":
+        data = downsample_line(df, x, y)
+        fig = px.line(data, x=x, y=y, hover_data=hover_columns(data, x, y))
+        if len(data) < len(df):
+            note = f"line downsampled from {len(df):,} to {len(data):,} points"
+    elif kind == "scatter":
+        numeric = pd.api.types.is_numeric_dtype(df[x]) and pd.api.types.is_numeric_dtype(df[y])
+        if len(df) > MAX_POINTS and numeric:
+            fig = density_heatmap(df, x, y)
+            note = f"{len(df):,} points binned into a {HEATMAP_BINS}x{HEATMAP_BINS} density map"
+        else:
+            data = df.sample(MAX_POINTS, random_state=0) if len(df) > MAX_POINTS else df
+            fig = px.scatter(data, x=x, y=y, hover_data=hover_columns(data, x, y))
+            if len(data) < len(df):
+                note = f"scatter sampled from {len(df):,} to {len(data):,} points"
+    else:
+        data, bar_y = top_n_bars(df, x, y)
+        fig = px.bar(data, x=x, y=bar_y, hover_data=hover_columns(data, x, bar_y))
+        notes = []
+        if bar_y != y:
+            notes.append(f"bars count the rows per {x} value")
+        if len(data) == MAX_BARS and len(df) > MAX_BARS:
+            notes.append(f"bars limited to the top {MAX_BARS - 1} {x} values plus \"Other\"")
+        note = "; ".join(notes) or None
+    return fig, note
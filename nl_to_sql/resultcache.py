@@ -0,0 +1,143 @@
+import hashlib
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+
+import spill
+
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+_IDENTIFIER = re.compile(r'"((?:[^"]|"")+)"|\b([A-Za-z_][A-Za-z0-9_]*)\b')
+
+def normalize_sql(sql):
+    # Collapse whitespace outside string literals and quoted identifiers only.
+    parts = _QUOTED.split(sql.strip().rstrip(";").strip())
+    return "".join(part if i % 2 else " ".join(part.split()) for i, part in enumerate(parts))
+
+def referenced_tables(sql, tables):
+    known = {t.lower(): t for t in tables}
+    found = set()
+    for quoted, bare in _IDENTIFIER.findall(sql):
+        name = (quoted.replace('""', '"') if quoted else bare).lower()
+        if name in known:
+            found.add(known[name])
+    return sorted(found)
+
+def is_read_only(sql):
+    head = sql.lstrip().split(None, 1)
+    return bool(head) and head[0].upper() in ("SELECT", "WITH")
+
+class ResultCache:
+    """Bounded LRU cache of query results.
+
+    Keys are the normalized SQL plus the data version of every table it reads,
+    so a re-upload of a table makes its entries unreachable. In-memory entries
+    are capped at `max_bytes` in total; results of at least `spill_bytes` are
+    written to Parquet files under `spill_dir` instead (when pyarrow is
+    installed), capped at `spill_max_bytes` on disk.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, spill_dir=None,
+                 spill_bytes=32 * 1024 * 1024, spill_max_bytes=2 * 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill.spill_dir(spill_dir)
+        self.spill_bytes = spill_bytes
+        self.spill_max_bytes = spill_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key -> (DataFrame or path, bytes, attrs)
+        self._memory = 0
+        self._disk = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sql, versions):
+        return (normalize_sql(sql), tuple(versions))
+
+    def get(self, sql, versions):
+        key = self.key(sql, versions)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        value, _, attrs = entry
+        if isinstance(value, str):
+            try:
+                df = spill.read(value)
+            except (OSError, ValueError):
+                self.remove(key)
+                return None
+            df.attrs.update(attrs)
+            return df
+        return value
+
+    def put(self, sql, versions, df):
+        key = self.key(sql, versions)
+        size = int(df.memory_usage(deep=True).sum())
+        to_disk = self.spill_dir is not None and size >= self.spill_bytes
+        if not to_disk and size > self.max_bytes:
+            return
+        if to_disk:
+            # Unique per put: a second put of the same key (two concurrent misses)
+            # must not write the file that replacing the first entry deletes.
+            digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+            path = spill.write(df, self.spill_dir, f"result_{digest}_{uuid.uuid4().hex[:8]}")
+            if path is None:
+                return
+            value, size = path, os.path.getsize(path)
+        else:
+            value = df
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (value, size, dict(df.attrs))
+            if to_disk:
+                self._disk += size
+            else:
+                self._memory += size
+            self._evict()
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        value, size, _ = entry
+        if isinstance(value, str):
+            self._disk -= size
+            spill.remove(value)
+        else:
+            self._memory -= size
+
+    def _evict(self):
+        for key in list(self._entries):
+            if self._memory <= self.max_bytes and self._disk <= self.spill_max_bytes:
+                break
+            value = self._entries[key][0]
+            over_disk = isinstance(value, str) and self._disk > self.spill_max_bytes
+            over_memory = not isinstance(value, str) and self._memory > self.max_bytes
+            if over_disk or over_memory:
+                self._pop(key)
+
+    def remove(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._pop(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._memory,
+                "disk_bytes": self._disk,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,84 @@
+PAGE_ROWS = 50
+RESULT_ROW_CAP = 100_000
+RESULT_MAX_BYTES = 64 * 1024 * 1024
+MAX_CELL_CHARS = 80
+MAX_PAGE_CHARS = 20_000
+_FETCH_BATCH = 5_000
+_COUNT_BATCH = 10_000
+
+def read_bounded(conn, sql, max_rows=RESULT_ROW_CAP, max_bytes=RESULT_MAX_BYTES):
+    """Execute `sql` and keep at most `max_rows` rows and about `max_bytes` of them.
+
+    Rows are fetched in batches; once either bound is reached the rest of the
+    cursor is drained without being stored, so the total row count is known
+    while memory stays bounded (pages past the kept rows are read again with
+    read_page). The count is kept in `df.attrs["total_rows"]`.
+    """
+    import pandas as pd
+
+    cursor = conn.execute(sql)
+    columns = [d[0] for d in cursor.description] if cursor.description else []
+    frames, kept, size, exhausted = [], 0, 0, False
+    while kept < max_rows and size < max_bytes:
+        rows = cursor.fetchmany(min(_FETCH_BATCH, max_rows - kept))
+        if not rows:
+            exhausted = True
+            break
+        frame = pd.DataFrame.from_records(rows, columns=columns)
+        frames.append(frame)
+        kept += len(frame)
+        size += int(frame.memory_usage(deep=True).sum())
+    total = kept
+    if not exhausted:
+        for batch in iter(lambda: cursor.fetchmany(_COUNT_BATCH), []):
+            total += len(batch)
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else \
+        frames[0] if frames else pd.DataFrame(columns=columns)
+    df.attrs["total_rows"] = total
+    return df
+
+def read_page(conn, sql, offset, limit):
+    # Pages past the materialized rows are streamed straight from SQLite.
+    import pandas as pd
+
+    cursor = conn.execute(f"SELECT * FROM ({sql.strip().rstrip(';')}) LIMIT ? OFFSET ?", (limit, offset))
+    columns = [d[0] for d in cursor.description]
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+
+def total_rows(df):
+    return df.attrs.get("total_rows", len(df))
+
+def count_label(total, capped=False):
+    # A result cut off by the row limit has at least that many rows, not exactly.
+    return f"at least {total:,}" if capped else f"{total:,}"
+
+def _truncate(value):
+    if isinstance(value, str) and len(value) > MAX_CELL_CHARS:
+        return value[:MAX_CELL_CHARS - 1] + "…"
+    return value
+
+def render(page, fmt="markdown"):
+    """Render a page with cell and total size caps, dropping trailing rows to fit."""
+    page = page.map(_truncate)
+    while True:
+        text = page.to_markdown(index=False) if fmt == "markdown" else page.to_string(index=False)
+        if len(text) <= MAX_PAGE_CHARS or len(page) <= 1:
+            return text[:MAX_PAGE_CHARS], len(page)
+        page = page.iloc[:max(1, len(page) * MAX_PAGE_CHARS // len(text))]
+
+def page_token(result_id, offset):
+    return f"{result_id}:{offset}"
+
+def parse_token(token):
+    result_id, _, offset = token.partition(":")
+    return result_id, int(offset or 0)
+
+def format_page(page, offset, total, result_id, fmt="markdown", capped=False):
+    text, shown = render(page, fmt)
+    if total == 0:
+        return text
+    end = offset + shown
+    footer = f"Rows {offset + 1:,}-{end:,} of {count_label(total, capped)}."
+    if end < total:
+        footer += f" Next page: `fetch_page(\"{page_token(result_id, end)}\")`"
+    return f"{text}\n\n{footer}"
@@ -0,0 +1,151 @@
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+
+import spill
+
+DEFAULT_SESSION = "default"
+
+@dataclass
+class Result:
+    sql: str
+    df: object = None
+    path: str | None = None
+    nbytes: int = 0
+    total_rows: int = 0
+    total_capped: bool = False
+    created: float = field(default_factory=time.time)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+
+    @property
+    def evicted(self):
+        return self.df is None and self.path is None
+
+    def load(self):
+        if self.df is not None:
+            return self.df
+        if self.path is not None:
+            return spill.read(self.path)
+        return None
+
+class Session:
+    def __init__(self, session_id):
+        self.id = session_id
+        self.tables = []
+        self.history = deque()
+        self.last_active = time.monotonic()
+
+    @property
+    def active_table(self):
+        return self.tables[-1] if self.tables else None
+
+    def use_table(self, table):
+        if table in self.tables:
+            self.tables.remove(table)
+        self.tables.append(table)
+
+    @property
+    def last_result(self):
+        return self.history[-1] if self.history else None
+
+    def find(self, result_id):
+        return next((r for r in self.history if r.id == result_id), None)
+
+class SessionStore:
+    """Per-client state: active tables and a bounded history of recent results.
+
+    Result frames are accounted against a global `max_bytes` budget. When it is
+    exceeded the oldest results across all sessions are spilled to Parquet under
+    `spill_dir` (if pyarrow is installed) or dropped. Sessions idle for longer
+    than `idle_timeout` seconds are removed together with their results.
+    """
+
+    def __init__(self, max_history=5, max_bytes=512 * 1024 * 1024, idle_timeout=3600, spill_dir=None):
+        self.max_history = max_history
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self.spill_dir = spill.spill_dir(spill_dir)
+        self._sessions = {}
+        self._memory = 0
+        self._lock = threading.RLock()
+
+    def get(self, session_id=None):
+        session_id = session_id or DEFAULT_SESSION
+        with self._lock:
+            self.evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+            session.last_active = time.monotonic()
+            return session
+
+    def add_result(self, session, sql, df):
+        result = Result(
+            sql=sql,
+            df=df,
+            nbytes=int(df.memory_usage(deep=True).sum()),
+            total_rows=df.attrs.get("total_rows", len(df)),
+            total_capped=df.attrs.get("total_capped", False),
+        )
+        with self._lock:
+            session.history.append(result)
+            self._memory += result.nbytes
+            while len(session.history) > self.max_history:
+                self._release(session.history.popleft())
+            self._enforce_budget(keep=result)
+        return result
+
+    def _release(self, result):
+        if result.df is not None:
+            self._memory -= result.nbytes
+            result.df = None
+        if result.path is not None:
+            spill.remove(result.path)
+            result.path = None
+
+    def _spill(self, result):
+        df, result.df = result.df, None
+        self._memory -= result.nbytes
+        if self.spill_dir is None:
+            return
+        result.path = spill.write(df, self.spill_dir, f"result_{uuid.uuid4().hex}")
+
+    def _enforce_budget(self, keep=None):
+        if self._memory <= self.max_bytes:
+            return
+        in_memory = sorted(
+            (r for s in self._sessions.values() for r in s.history if r.df is not None and r is not keep),
+            key=lambda r: r.created,
+        )
+        for result in in_memory:
+            if self._memory <= self.max_bytes:
+                break
+            self._spill(result)
+
+    def evict_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if now - session.last_active > self.idle_timeout:
+                    for result in session.history:
+                        self._release(result)
+                    del self._sessions[session_id]
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                for result in session.history:
+                    self._release(result)
+            self._sessions.clear()
+
+    def stats(self):
+        with self._lock:
+            results = [r for s in self._sessions.values() for r in s.history]
+            return {
+                "sessions": len(self._sessions),
+                "results": len(results),
+                "memory_bytes": self._memory,
+                "spilled": sum(1 for r in results if r.path is not None),
+            }
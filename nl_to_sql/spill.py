@@ -0,0 +1,31 @@
+import os
+from importlib.util import find_spec
+
+# Looked up without importing it; pyarrow (and pandas) load on the first spill.
+HAS_PYARROW = find_spec("pyarrow") is not None
+
+def spill_dir(path):
+    # Spilling writes Parquet, so it is off when pyarrow is missing.
+    return path if HAS_PYARROW else None
+
+def write(df, directory, name):
+    """Write `df` to `directory`/`name`.parquet; return the path, or None on failure."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.parquet")
+    try:
+        df.to_parquet(path, index=False)
+    except Exception:
+        remove(path)
+        return None
+    return path
+
+def read(path):
+    import pandas as pd
+
+    return pd.read_parquet(path)
+
+def remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
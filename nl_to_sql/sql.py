@@ -1,6 +1,16 @@
-import sqlite3
-import pandas as pd
+import logging
+import re
+import time
 import os
+from db import quote, transaction
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 50_000
+SAMPLE_ROWS = 1_000
+MIN_YEAR_COLUMNS = 10
+LONG_SUFFIX = "_long"
+_YEAR = re.compile(r"^(1[89]|20)\d\d$")
 
 def sanitize_column_names(df):
 	df.columns=df.columns.str.replace(r'\W+','_',regex=True).str.strip()
@@ -8,13 +18,144 @@ def sanitize_column_names(df):
 
 db_path = "sqlite.db"
 
-def csv_to_sqlite(csv_path, db_path):
-    df = pd.read_csv(csv_path)
-    df = sanitize_column_names(df)
+def infer_column_types(csv_path, sample_rows=SAMPLE_ROWS):
+    # Decide the SQLite column affinity of every column from a small sample, so the
+    # bulk of the file can be read as plain strings and converted by SQLite itself.
+    # Columns that are empty throughout the sample are left untyped (None) and
+    # typed from the values the rest of the file has.
+    import pandas as pd
+
+    sample = sanitize_column_names(pd.read_csv(csv_path, nrows=sample_rows))
+    types = {}
+    for col, dtype in sample.dtypes.items():
+        if not sample[col].notna().any():
+            types[col] = None
+        elif pd.api.types.is_bool_dtype(dtype):
+            types[col] = "INTEGER"
+        elif pd.api.types.is_integer_dtype(dtype):
+            types[col] = "INTEGER"
+        elif pd.api.types.is_float_dtype(dtype):
+            types[col] = "REAL"
+        else:
+            types[col] = "TEXT"
+    bools = [col for col, dtype in sample.dtypes.items() if pd.api.types.is_bool_dtype(dtype)]
+    return types, bools
+
+def widen_type(current, values):
+    """The narrowest of INTEGER, REAL and TEXT holding `current` values and the strings in `values`."""
+    values = values.dropna()
+    if current == "TEXT" or values.empty:
+        return current
+    import pandas as pd
+
+    numbers = pd.to_numeric(values, errors="coerce")
+    if numbers.isna().any():
+        return "TEXT"
+    if current == "REAL" or (numbers % 1 != 0).any():
+        return "REAL"
+    return "INTEGER"
+
+def retype_table(conn, table_name, types):
+    # SQLite cannot change a column's declared type, so the table is copied into
+    # one with the final types; numeric text is converted on the way.
+    staging = table_name + "__retype"
+    conn.execute(f"DROP TABLE IF EXISTS {quote(staging)}")
+    conn.execute("CREATE TABLE {} ({})".format(
+        quote(staging), ", ".join(f"{quote(c)} {t}" for c, t in types.items())
+    ))
+    conn.execute(f"INSERT INTO {quote(staging)} SELECT * FROM {quote(table_name)}")
+    conn.execute(f"DROP TABLE {quote(table_name)}")
+    conn.execute(f"ALTER TABLE {quote(staging)} RENAME TO {quote(table_name)}")
+
+def long_table_name(table_name):
+    return table_name.replace("-", "_") + LONG_SUFFIX
+
+def detect_year_layout(columns):
+    """Return (country, code, year columns) for wide one-column-per-year files, else None."""
+    years = [c for c in columns if _YEAR.match(c)]
+    if len(years) < MIN_YEAR_COLUMNS:
+        return None
+    ids = [c for c in columns if c not in years]
+    if not ids:
+        return None
+    country = next((c for c in ids if "country" in c.lower()), ids[0])
+    code = next(
+        (c for c in ids if c != country and c.lower() in ("code", "country_code", "abbreviation", "iso", "iso3")),
+        next((c for c in ids if c != country), None),
+    )
+    return country, code, years
+
+def log_progress(rows, elapsed):
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    logger.info("ingested %d rows in %.2fs (%.0f rows/s)", rows, elapsed, rate)
+
+def insert_long(conn, long_name, chunk, country, code, years):
+    ids = [country] + ([code] if code else [])
+    long = chunk[ids + years].melt(id_vars=ids, var_name="year", value_name="value")
+    long = long[long["value"].notna()]
+    rows = zip(
+        long[country].tolist(),
+        long[code].tolist() if code else [None] * len(long),
+        long["year"].astype(int).tolist(),
+        long["value"].tolist(),
+    )
+    conn.executemany(f"INSERT INTO {quote(long_name)} VALUES (?, ?, ?, ?)", rows)
+
+def csv_to_sqlite(csv_path, db_path, chunk_rows=CHUNK_ROWS, progress=log_progress, long_format="auto"):
+    # pandas is imported on first use, so loading this module (the catalog and
+    # engine need its helpers) does not pull it in at server startup.
+    import pandas as pd
+
     table_name = os.path.splitext(os.path.basename(csv_path))[0]
-	
-    conn=sqlite3.connect(db_path)
-    df.to_sql(table_name, conn, if_exists='replace', index=False)
-    conn.close()
+    types, bools = infer_column_types(csv_path)
+    columns = list(types)
+    untyped = {col: None for col, t in types.items() if t is None}
+
+    # Year-wide files (one column per year) also get a normalized long table so
+    # time-series questions become indexed range scans instead of wide scans.
+    layout = detect_year_layout(columns) if long_format == "auto" else None
+    long_name = long_table_name(table_name)
+
+    # Every chunk is read as strings with an explicit dtype map: no per-chunk type
+    # inference, and the declared column affinity turns numeric text into numbers.
+    reader = pd.read_csv(csv_path, dtype=str, chunksize=chunk_rows)
+    create_sql = "CREATE TABLE {} ({})".format(
+        quote(table_name), ", ".join(f"{quote(c)} {t or 'TEXT'}" for c, t in types.items())
+    )
+    insert_sql = "INSERT INTO {} VALUES ({})".format(quote(table_name), ", ".join("?" * len(columns)))
+
+    start = time.perf_counter()
+    rows = 0
+    with transaction(db_path) as conn:
+        conn.execute(f"DROP TABLE IF EXISTS {quote(table_name)}")
+        conn.execute(create_sql)
+        conn.execute(f"DROP TABLE IF EXISTS {quote(long_name)}")
+        if layout:
+            conn.execute(
+                f"CREATE TABLE {quote(long_name)} (country TEXT, code TEXT, year INTEGER, value REAL)"
+            )
+        for chunk in reader:
+            chunk.columns = columns
+            for col in bools:
+                # Values other than true/false (past the sample) are kept as they are.
+                flags = chunk[col].str.lower().map({"true": 1, "false": 0})
+                chunk[col] = flags.where(flags.notna(), chunk[col])
+            for col in untyped:
+                untyped[col] = widen_type(untyped[col], chunk[col])
+            if layout:
+                insert_long(conn, long_name, chunk, *layout)
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            conn.executemany(insert_sql, chunk.itertuples(index=False, name=None))
+            rows += len(chunk)
+            if progress:
+                progress(rows, time.perf_counter() - start)
+        widened = {col: t for col, t in untyped.items() if t not in (None, "TEXT")}
+        if widened:
+            types = {col: widened.get(col) or t or "TEXT" for col, t in types.items()}
+            retype_table(conn, table_name, types)
+        if layout:
+            # Built after the load, which is much cheaper than maintaining them per row.
+            conn.execute(f"CREATE INDEX {quote('ix_' + long_name + '_code_year')} ON {quote(long_name)} (code, year)")
+            conn.execute(f"CREATE INDEX {quote('ix_' + long_name + '_year')} ON {quote(long_name)} (year, value)")
 
-    return table_name
\ No newline at end of file
+    return table_name
@@ -0,0 +1,129 @@
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+_WORD = re.compile(r"\w+")
+
+def normalize_question(question):
+    text = unicodedata.normalize("NFKC", question).lower()
+    return " ".join(_WORD.findall(text))
+
+def similarity(a, b):
+    # Jaccard similarity over word sets. Numbers must match exactly: "top 5" and
+    # "top 10" are different questions no matter how similar the rest is.
+    ta, tb = set(a.split()), set(b.split())
+    if {t for t in ta if t.isdigit()} != {t for t in tb if t.isdigit()}:
+        return 0.0
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+class SQLCache:
+    """Persistent cache of generated SQL keyed on (normalized question, schema hash).
+
+    Exact matches are looked up by primary key. When `fuzzy_threshold` is set,
+    a miss falls back to the most similar cached question for the same schema.
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted beyond `max_entries`.
+    """
+
+    FUZZY_CANDIDATES = 500
+
+    def __init__(self, path, max_entries=5000, ttl=30 * 24 * 3600, fuzzy_threshold=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sql_cache (
+                question TEXT NOT NULL,
+                schema_hash TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (question, schema_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sql_cache_lru ON sql_cache (last_used)")
+        self._conn.commit()
+
+    def get(self, question, schema_hash):
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT question, sql FROM sql_cache WHERE question = ? AND schema_hash = ? AND created > ?",
+                (key, schema_hash, now - self.ttl),
+            ).fetchone()
+            if row is None and self.fuzzy_threshold:
+                row = self._fuzzy(key, schema_hash, now)
+                if row is not None:
+                    self.fuzzy_hits += 1
+            elif row is not None:
+                self.hits += 1
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE sql_cache SET last_used = ?, hits = hits + 1 WHERE question = ? AND schema_hash = ?",
+                (now, row[0], schema_hash),
+            )
+            self._conn.commit()
+            return row[1]
+
+    def _fuzzy(self, key, schema_hash, now):
+        candidates = self._conn.execute(
+            "SELECT question, sql FROM sql_cache WHERE schema_hash = ? AND created > ? "
+            "ORDER BY last_used DESC LIMIT ?",
+            (schema_hash, now - self.ttl, self.FUZZY_CANDIDATES),
+        ).fetchall()
+        best, best_score = None, self.fuzzy_threshold
+        for candidate in candidates:
+            score = similarity(key, candidate[0])
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def put(self, question, schema_hash, sql):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sql_cache (question, schema_hash, sql, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (normalize_question(question), schema_hash, sql, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM sql_cache WHERE created <= ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM sql_cache WHERE rowid IN ("
+            "SELECT rowid FROM sql_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+        lookups = self.hits + self.fuzzy_hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.fuzzy_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,190 @@
+import math
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from resultcache import _QUOTED
+
+MAX_COST = 1e9
+PROGRESS_STEPS = 10_000
+
+_FENCE = re.compile(r"```[ \t]*(?:sql|sqlite)?[ \t]*\n?(.*?)```", re.IGNORECASE | re.DOTALL)
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?(?:\*/|$)", re.DOTALL)
+_WORD = re.compile(r"\b(LIMIT)\b|([()])", re.IGNORECASE)
+_LOOP = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\S+)")
+_NAMED = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\S+)")
+_SOURCE = re.compile(
+    r'(?:\bFROM|\bJOIN|,)\s*("(?:[^"]|"")+"|[A-Za-z_][A-Za-z0-9_]*)(?:\s+(?:AS\s+)?("(?:[^"]|"")+"|[A-Za-z_][A-Za-z0-9_]*))?',
+    re.IGNORECASE,
+)
+_NOT_ALIAS = {
+    "from", "where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using",
+    "group", "order", "limit", "union", "except", "intersect", "having", "window",
+}
+
+# Actions a generated query may perform: reading tables and calling functions.
+_ALLOWED = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION}
+if hasattr(sqlite3, "SQLITE_RECURSIVE"):
+    _ALLOWED.add(sqlite3.SQLITE_RECURSIVE)
+
+class SQLRejected(ValueError):
+    pass
+
+def _unquote(name):
+    return name[1:-1].replace('""', '"') if name.startswith('"') else name
+
+def _outside_quotes(sql):
+    # The parts of `sql` that are not string literals or quoted identifiers.
+    return _QUOTED.split(sql)[::2]
+
+def extract_sql(text):
+    """Pull the SQL out of a model reply: the first fenced block if any, minus trailing semicolons."""
+    text = text.strip()
+    match = _FENCE.search(text)
+    if match:
+        text = match.group(1)
+    elif text.startswith("```"):
+        text = text.strip("`")
+    return text.strip().rstrip(";").strip()
+
+def strip_comments(sql):
+    parts = _QUOTED.split(sql)
+    return "".join(part if i % 2 else _COMMENT.sub(" ", part) for i, part in enumerate(parts)).strip()
+
+def is_single_statement(sql):
+    sql = sql.rstrip().rstrip(";")
+    return all(";" not in part for part in _outside_quotes(sql))
+
+def has_limit(sql):
+    depth = 0
+    for part in _outside_quotes(sql):
+        for limit, paren in _WORD.findall(part):
+            if paren:
+                depth += 1 if paren == "(" else -1
+            elif depth == 0:
+                return True
+    return False
+
+def add_limit(sql, limit):
+    return sql if not limit or has_limit(sql) else f"{sql}\nLIMIT {int(limit)}"
+
+def validate(conn, sql):
+    """Compile `sql` against the live schema without running it.
+
+    An authorizer denies anything but reads, so writes, ATTACH, PRAGMA and the
+    like fail at prepare time whatever the statement looks like.
+    """
+    def authorize(action, *_):
+        return sqlite3.SQLITE_OK if action in _ALLOWED else sqlite3.SQLITE_DENY
+
+    conn.set_authorizer(authorize)
+    try:
+        conn.execute("EXPLAIN " + sql).fetchall()
+    except sqlite3.DatabaseError as e:
+        if "not authorized" in str(e):
+            raise SQLRejected("only read-only SELECT queries are allowed") from e
+        raise SQLRejected(str(e)) from e
+    finally:
+        conn.set_authorizer(None)
+
+def aliases(sql):
+    found = {}
+    for name, alias in _SOURCE.findall(sql):
+        table = _unquote(name)
+        found[table] = table
+        if alias and alias.lower() not in _NOT_ALIAS:
+            found[_unquote(alias)] = table
+    return found
+
+def estimate_cost(plan, row_count, names=None):
+    """Rough number of rows visited, from EXPLAIN QUERY PLAN rows.
+
+    Sibling SCAN/SEARCH steps are nested loops, so their row estimates
+    multiply: a full scan visits every row, an index search about log2 of
+    them. Subqueries add their own cost (once per outer row when correlated)
+    and a materialized subquery is assumed to yield as many rows as it visits.
+    """
+    names = names or {}
+    known = [n for n in (row_count(t) for t in set(names.values())) if n is not None]
+    fallback = max(known, default=1000)
+    children = {}
+    for node, parent, _, detail in plan:
+        children.setdefault(parent, []).append((node, detail))
+    produced = {}
+
+    def cost(parent):
+        loops, extra, nested = 1.0, 0.0, False
+        for node, detail in children.get(parent, []):
+            loop = _LOOP.match(detail)
+            if loop:
+                name = loop.group(2).strip('"')
+                rows = produced.get(name)
+                if rows is None:
+                    rows = row_count(names.get(name, name))
+                if rows is None:
+                    rows = fallback
+                nested = True
+                loops *= rows if loop.group(1) == "SCAN" else max(1.0, math.log2(rows + 1))
+                extra += cost(node)
+                continue
+            sub = cost(node)
+            named = _NAMED.match(detail)
+            if named:
+                produced[named.group(1).strip('"')] = max(1.0, sub)
+            extra += sub * loops if detail.startswith("CORRELATED") else sub
+        return (loops if nested else 0.0) + extra
+
+    return cost(0)
+
+def explain(conn, sql):
+    return conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+
+@contextmanager
+def time_budget(conn, seconds, steps=PROGRESS_STEPS):
+    """Abort statements on `conn` that run longer than `seconds` of wall time."""
+    if not seconds:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    conn.set_progress_handler(lambda: time.monotonic() > deadline, steps)
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"query exceeded its {seconds:g}s time budget") from e
+        raise
+    finally:
+        conn.set_progress_handler(None, steps)
+
+def prepare(sql):
+    """The statement from a model reply, without comments, if it is a single SELECT."""
+    sql = strip_comments(extract_sql(sql)).rstrip(";").strip()
+    if not sql:
+        raise SQLRejected("empty query")
+    if not is_single_statement(sql):
+        raise SQLRejected("only a single SQL statement is allowed")
+    head = sql.split(None, 1)[0].upper()
+    if head not in ("SELECT", "WITH"):
+        raise SQLRejected(f"only SELECT queries are allowed, got {head}")
+    return sql
+
+def check(conn, sql, row_count, limit=None, max_cost=MAX_COST):
+    """Validate a generated query and return the SQL to run.
+
+    Raises SQLRejected when the text is not a single read-only statement that
+    compiles against the schema, or when its estimated cost exceeds `max_cost`.
+    `row_count(table)` supplies table sizes for the estimate, None if unknown.
+    """
+    sql = prepare(sql)
+    validate(conn, sql)
+
+    sql = add_limit(sql, limit)
+    if max_cost:
+        cost = estimate_cost(explain(conn, sql), row_count, aliases(sql))
+        if cost > max_cost:
+            raise SQLRejected(
+                f"estimated cost of {cost:,.0f} rows exceeds the {max_cost:,.0f} limit; "
+                "add filters or join conditions"
+            )
+    return sql